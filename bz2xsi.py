@@ -1,4 +1,7 @@
 """This module provides BZ2 XSI utilities, including a parser and writer for XSI files."""
+from functools import lru_cache
+from itertools import chain
+
 VERSION = 1.13
 
 # No print calls will be made by the module if this is False
@@ -38,16 +41,17 @@ class _FrameContainer:
 		
 		return frame
 	
+	# Depth-first, parents before children. Uses an explicit stack rather than recursive generators.
 	def get_all_frames(self):
-		frames = []
-		for frame in self.frames:
+		stack = list(reversed(self.frames))
+		
+		while stack:
+			frame = stack.pop()
 			yield frame
-			yield from frame.get_all_frames()
+			stack.extend(reversed(frame.frames))
 	
 	def find_frame(self, name):
-		for frame in self.get_all_frames():
-			if frame.name == name:
-				return frame
+		return next((frame for frame in self.get_all_frames() if frame.name == name), None)
 	
 	def get_animated_frames(self):
 		for frame in self.get_all_frames():
@@ -87,27 +91,35 @@ class XSI(_FrameContainer):
 			self.read(filepath)
 	
 	def read(self, filepath, re_skip=None):
-		with open(filepath, "r") as f:
+		with open(filepath, "rb") as f:
 			self.name = filepath
 			Reader(f, bz2xsi_xsi=self, re_skip=re_skip, log_name=self.name)
 	
 	def write(self, filepath):
-		with open(filepath, "w") as f:
+		with open(filepath, "w", encoding=Reader.ENCODING) as f:
 			Writer(self, f)
 	
 	def is_skinned(self):
-		return len(list(self.get_skinned_frames())) >= 1
+		return any(self.get_skinned_frames())
 	
 	def is_animated(self):
-		return len(list(self.get_animated_frames())) >= 1
+		return any(self.get_animated_frames())
 	
 	# String representation will result in XML output
 	def __str__(self):
-		return "%s<XSI>%s%s</XSI>" % (
-			"<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"no\" ?>\n",
-			"".join(map(str, self.lights)),
-			"".join(map(str, self.frames)),
-		)
+		buffer = []
+		self.render(buffer)
+		return "".join(buffer)
+	
+	# The str() methods of XSI, Frame, Mesh & Matrix append their pieces to one shared (buffer) this way
+	def render(self, buffer):
+		buffer.append("<?xml version=\"1.0\" encoding=\"UTF-8\" standalone=\"no\" ?>\n<XSI>")
+		buffer.extend(map(str, self.lights))
+		
+		for frame in self.frames:
+			frame.render(buffer)
+		
+		buffer.append("</XSI>")
 
 class PointLight:
 	def __init__(self, name, rgb=None, location_xyz=None):
@@ -160,15 +172,32 @@ class Frame(_FrameContainer):
 		self.envelopes = []
 	
 	def __str__(self):
-		return "<Frame>%s%s%s%s%s%s%s</Frame>" % (
-			self.name,
-			str(self.transform),
-			str(self.pose),
-			str(self.mesh),
-			"".join(map(str, self.frames)),
-			"".join(map(str, self.animation_keys)),
-			"".join(map(str, self.envelopes)),
-		)
+		buffer = []
+		self.render(buffer)
+		return "".join(buffer)
+	
+	def render(self, buffer):
+		# Sub frames are rendered from an explicit stack, strings on it are the remainder of a parent frame
+		stack = [self]
+		
+		while stack:
+			frame = stack.pop()
+			
+			if isinstance(frame, str):
+				buffer.append(frame)
+				continue
+			
+			buffer.append("<Frame>")
+			buffer.append(frame.name)
+			
+			for item in (frame.transform, frame.pose, frame.mesh):
+				if item is None:
+					buffer.append("None")
+				else:
+					item.render(buffer)
+			
+			stack.append("".join(map(str, frame.animation_keys)) + "".join(map(str, frame.envelopes)) + "</Frame>")
+			stack.extend(reversed(frame.frames))
 	
 	def get_animation_frame_range(self):
 		start = end = None
@@ -184,10 +213,11 @@ class Frame(_FrameContainer):
 		frm, chain = self, []
 		
 		while frm:
-			chain += [frm.name]
+			chain.append(frm.name)
 			frm = frm.parent
 		
-		return delimiter.join(reversed(chain))
+		chain.reverse()
+		return delimiter.join(chain)
 	
 	def add_animationkey(self, *args):
 		self.animation_keys.append(AnimationKey(*args))
@@ -207,10 +237,18 @@ class Matrix:
 	def __str__(self):
 		return "<Matrix>(x=%f y=%f z=%f)</Matrix>" % tuple(self.posit[0:3])
 	
+	def render(self, buffer):
+		buffer.append(str(self))
+	
 	def to_list(self):
 		return [list(self.right), list(self.up), list(self.front), list(self.posit)]
+	
+	# Columns of the matrix as rows, e.g. for column-major matrix types like blender's
+	def to_list_transposed(self):
+		return list(zip(self.right, self.up, self.front, self.posit))
 
 class Mesh:
+	# Vertex and face data can be any sequence of vectors, such as lists of tuples or 2D numpy arrays
 	def __init__(self, name=None):
 		self.name=name
 		
@@ -229,8 +267,13 @@ class Mesh:
 		self.vertex_color_faces = []
 	
 	def __str__(self):
+		buffer = []
+		self.render(buffer)
+		return "".join(buffer)
+	
+	def render(self, buffer):
 		def XML(name, vertices, faces):
-			if vertices or faces:
+			if len(vertices) or len(faces):
 				return "<%s>%d Vertices %d Faces</%s>" % (
 					name,
 					len(vertices),
@@ -242,25 +285,29 @@ class Mesh:
 		
 		indices, materials = self.get_material_indices()
 		
-		return "<Mesh>%d Vertices %d Faces%s%s%s%s</Mesh>" % (
-			len(self.vertices),
-			len(self.faces),
-			"".join(map(str, materials)),
-			XML("Normals", self.normal_vertices, self.normal_faces),
-			XML("UV-Map", self.uv_vertices, self.uv_faces),
-			XML("Vertex-Colors", self.vertex_colors, self.vertex_color_faces)
-		)
+		buffer.append("<Mesh>%d Vertices %d Faces" % (len(self.vertices), len(self.faces)))
+		buffer.extend(map(str, materials))
+		buffer.append(XML("Normals", self.normal_vertices, self.normal_faces))
+		buffer.append(XML("UV-Map", self.uv_vertices, self.uv_faces))
+		buffer.append(XML("Vertex-Colors", self.vertex_colors, self.vertex_color_faces))
+		buffer.append("</Mesh>")
 	
 	def get_material_indices(self):
-		materials = []
+		# Equal materials share an index, keyed by value in the order they first appear.
+		# Faces usually share material instances, so each instance is only hashed by value once.
+		material_table = {}
+		index_by_id = {}
 		indices = []
+		
 		for material in self.face_materials:
-			if not material in materials:
-				materials += [material]
+			index = index_by_id.get(id(material))
+			
+			if index is None:
+				index = index_by_id[id(material)] = material_table.setdefault(material, len(material_table))
 			
-			indices += [materials.index(material)]
+			indices.append(index)
 		
-		return indices, materials
+		return indices, list(material_table)
 
 class Material:
 	def __init__(self,
@@ -268,10 +315,11 @@ class Material:
 				ambient=None, emissive=None, shading_type=DEFAULT_SHADING_TYPE,
 				texture=None
 			):
-		self.diffuse  = diffuse  if diffuse  else list(DEFAULT_DIFFUSE)
-		self.specular = specular if specular else list(DEFAULT_SPECULAR)
-		self.emissive = emissive if emissive else list(DEFAULT_EMISSIVE)
-		self.ambient  = ambient  if ambient  else list(DEFAULT_AMBIENT)
+		# Colors are kept as tuples so materials can be compared and hashed cheaply
+		self.diffuse  = tuple(diffuse)  if diffuse  else DEFAULT_DIFFUSE
+		self.specular = tuple(specular) if specular else DEFAULT_SPECULAR
+		self.emissive = tuple(emissive) if emissive else DEFAULT_EMISSIVE
+		self.ambient  = tuple(ambient)  if ambient  else DEFAULT_AMBIENT
 		
 		self.hardness = hardness
 		self.shading_type = shading_type
@@ -295,19 +343,25 @@ class Material:
 	def __str__(self):
 		return "<Material>%r (%f, %f, %f, %f)</Material>" % (str(self.texture), *self.diffuse)
 	
-	def __eq__(self, other):
+	def get_key(self):
 		return (
-			self.texture == other.texture
-			and self.diffuse      == other.diffuse
-			and self.hardness     == other.hardness
-			and self.specular     == other.specular
-			and self.ambient      == other.ambient
-			and self.emissive     == other.emissive
-			and self.shading_type == other.shading_type
+			self.texture,
+			self.diffuse,
+			self.hardness,
+			self.specular,
+			self.ambient,
+			self.emissive,
+			self.shading_type
 		)
 	
-	def __nq__(self, other):
+	def __eq__(self, other):
+		return self is other or self.get_key() == other.get_key()
+	
+	def __ne__(self, other):
 		return not self.__eq__(other)
+	
+	def __hash__(self):
+		return hash(self.get_key())
 
 class AnimationKey:
 	TYPE_SIZE = (
@@ -350,6 +404,19 @@ class Envelope:
 
 class XSIParseError(Exception): pass
 
+# Fuses (name, compiled pattern) pairs into one alternation which matches wherever the first matching pattern would.
+# Match.lastgroup gives the name of the pattern which matched, alternatives named None are left unnamed.
+def _union_patterns(named_patterns):
+	import re
+	alternatives = []
+	
+	for name, pattern in named_patterns:
+		flags = "".join(letter for flag, letter in ((re.I, "i"), (re.M, "m"), (re.S, "s"), (re.X, "x")) if pattern.flags & flag)
+		source = re.sub(r"^\(\?[aiLmsux]+\)", "", pattern.pattern) # Global flags are only allowed at the start of a pattern
+		alternatives.append("(%s(?%s:%s))" % ("?P<%s>" % name if name else "?:", flags, source))
+	
+	return re.compile("|".join(alternatives) if alternatives else "(?!)")
+
 class Reader:
 	# Prevent number strings like "0.0" from raising exceptions in int()
 	def int_float(value):
@@ -357,12 +424,11 @@ class Reader:
 	
 	BLOCK_EOF = None
 	BLOCK_END = False
-	MAX_WORD = 128
 	UNNAMED_FRAME_NAME = "unnamed"
-	NON_CHARACTERS = "\r"
 	
 	# These regular expressions allow for looser syntax matching of different XSI template names.
 	import re
+	from itertools import islice
 	RE_HEADER             = re.compile(r"(?i)^\s*xsi\s*0101txt\s*0032\s*$")
 	RE_FRAME              = re.compile(r"(?i)(?:SI_)?Frame")
 	RE_TRANSFORM_MATRIX   = re.compile(r"(?i)(?:SI_)?(?:Frame)?(?:Transform)?Matrix")
@@ -386,19 +452,107 @@ class Reader:
 	RE_JUNK = re.compile(r"(?i)(?:SI_)?(?:Fog|Ambience|Angle|Coord.+?|AnimationParam.+?)")
 	DEFAULT_RE_SKIP = set((RE_JUNK,))
 	
+	# Known block types for each context, in order of precedence
+	DISPATCH_ROOT = _union_patterns((
+		("light", RE_LIGHT),
+		("camera", RE_CAMERA),
+		("frame", RE_FRAME),
+		("animation_set", RE_ANIMATION_SET),
+		("envelope_list", RE_ENVELOPE_LIST)
+	))
+	DISPATCH_FRAME = _union_patterns((
+		("transform_matrix", RE_TRANSFORM_MATRIX),
+		("pose_matrix", RE_POSE_MATRIX),
+		("mesh", RE_MESH),
+		("frame", RE_FRAME),
+		("animation_set", RE_ANIMATION_SET),
+		("envelope_list", RE_ENVELOPE_LIST)
+	))
+	DISPATCH_MESH = _union_patterns((
+		("material_list", RE_MESH_MATERIALLIST),
+		("normals", RE_MESH_NORMALS),
+		("uvmap", RE_MESH_UVMAP),
+		("vertex_colors", RE_MESH_VERTEX_COLORS)
+	))
+	
+	# Tokenizers, braces are only delimiters in block headers and are otherwise part of words.
+	# These work on the raw bytes of the file, only names and strings are decoded (see decode()).
+	# Files are written in ENCODING, words which aren't valid in it are decoded with the first of
+	# DECODE_FALLBACKS that works, Windows-1252 being what older Windows tools wrote.
+	ENCODING = "utf-8"
+	DECODE_FALLBACKS = ("cp1252", "latin-1") # Latin-1 decodes any byte, so nothing is lost
+	RE_BLOCK_HEADER  = re.compile(rb"([^{}]*)([{}])")
+	RE_WORD          = re.compile(rb"""[ \t\r\n,;]*(?:([^ \t\r\n,;"']*)(?:"([^"]*)"|'([^']*)')|([^ \t\r\n,;"']+))""")
+	RE_DATA_WORD     = re.compile(rb"[ \t\r\n,;]*([^ \t\r\n,;]+)") # Unquoted words only, for bulk numeric data
+	# Skips every word up to the next lone '{' or '}' word, group 1 is empty at EOF
+	RE_SKIP_TO_BRACE = re.compile(rb"""(?:[ \t\r\n,;]+|[^ \t\r\n,;"'{}][^ \t\r\n,;"']*|"[^"]*"|'[^']*'|[{}][^ \t\r\n,;"']+)*([{}]?)""")
+	
 	def __init__(self, f, bz2xsi_xsi=None, re_skip=None, log_name="XSI"):
-		self.f = f
+		# Tokens are matched against the whole file from (self.offset)
+		self.data = self.load(f)
+		self.size = len(self.data)
+		self.offset = 0
+		
 		self.xsi = bz2xsi_xsi if bz2xsi_xsi else XSI()
 		self.re_skip = Reader.DEFAULT_RE_SKIP.copy() if re_skip is None else re_skip
+		self.re_skip_any = _union_patterns((None, r) for r in self.re_skip)
 		
 		self.log_name = log_name # Name used in Reader.pos
+		self.name_counter = {} # Next number to try when renaming a duplicate frame name
+		self.materials = {} # Every distinct material read so far, mapped to itself
 		self.line = 1
-		self.col = 1
+		self.line_start = 0 # Offset of the first character of (self.line)
+		self.line_counted = 0 # Offset up to which newlines have been counted
 		
-		self.read()
+		try:
+			self.read()
+		finally:
+			if hasattr(self.data, "close"):
+				self.data.close()
+	
+	# Memory maps (f) if it's a real file, otherwise its data is read whole and encoded if it's text
+	def load(self, f):
+		import mmap
+		
+		try:
+			return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		except (AttributeError, OSError, ValueError): # Empty files can't be mapped either
+			data = f.read()
+		
+		return data.encode(Reader.ENCODING) if isinstance(data, str) else data
+	
+	def decode(self, word):
+		try:
+			return word.decode(Reader.ENCODING)
+		except UnicodeDecodeError:
+			pass
+		
+		for encoding in Reader.DECODE_FALLBACKS:
+			try:
+				return word.decode(encoding)
+			except UnicodeDecodeError:
+				pass
 	
 	def pos(self, info=""):
-		return "%s:%d:%d:%s" % (self.log_name, self.line, self.col, info)
+		# Line/col are only worked out for debugging and error reporting, counting on from the previous call
+		text = self.data[self.line_counted:self.offset]
+		newlines = text.count(b"\n")
+		
+		if newlines:
+			self.line += newlines
+			self.line_start = self.line_counted + text.rfind(b"\n") + 1
+		
+		self.line_counted = max(self.line_counted, self.offset)
+		
+		return "%s:%d:%d:%s" % (self.log_name, self.line, self.offset - self.line_start + 1, info)
+	
+	# Returns the name of the alternative in (dispatch_re) matching (block_type), or "skip" if it's to be skipped
+	def dispatch(self, dispatch_re, block_type):
+		if self.re_skip_any.match(block_type):
+			return "skip"
+		
+		match = dispatch_re.match(block_type)
+		return match.lastgroup if match else None
 	
 	# Cleans prefix information out of data block names
 	def clean(self, name):
@@ -418,114 +572,57 @@ class Reader:
 	
 	def parse_block_headers(self):
 		while True:
-			word = ""
-			name, parameters = None, []
-			
-			for i in range(Reader.MAX_WORD):
-				c = self.f.read(1)
-				
-				# No more data in file
-				if not c:
-					# yield Reader.BLOCK_EOF, None
-					return
-				
-				# Update line/col for debugging and error reporting
-				if c in Reader.NON_CHARACTERS:
-					continue
-				elif c == "\n":
-					self.line += 1
-					self.col = 1
-				else:
-					self.col += 1
-				
-				# Create word if delimiter is found
-				if c in " \t\n{}":
-					if word:
-						if name == None:
-							name = word
-						else:
-							parameters.append(word)
-						
-						word = ""
-				else:
-					# Treat ';' & ',' as delimiters until first character is found
-					if word or not c in ",;":
-						word += c
-				
-				if c == "{":
-					yield name, parameters
-					break
-				
-				elif c == "}":
-					# yield Reader.BLOCK_END, None
-					return
-			else:
-				raise XSIParseError(self.pos("Single Data Word Exceeded %d" % Reader.MAX_WORD))
-	
-	def parse_word(self):
-		word = ""
-		in_quote = False
-		
-		for i in range(Reader.MAX_WORD):
-			c = self.f.read(1)
+			match = Reader.RE_BLOCK_HEADER.match(self.data, self.offset)
 			
 			# No more data in file
-			if not c:
-				return Reader.BLOCK_EOF
+			if not match:
+				self.offset = self.size
+				# yield Reader.BLOCK_EOF, None
+				return
 			
-			# Being in a quote always takes presedence
-			if in_quote:
-				if c == "\n":
-					continue
-					# raise XSIParseError(self.pos("Unterminated String"))
-				
-				if not c in Reader.NON_CHARACTERS:
-					self.col += 1
-					
-					if c == in_quote:
-						return word
-					
-					word += c
-					
-					continue
-			
-			# Update line/col for debugging and error reporting
-			if c in Reader.NON_CHARACTERS:
-				continue
-			elif c == "\n":
-				self.line += 1
-				self.col = 1
-			else:
-				self.col += 1
+			self.offset = match.end()
 			
-			# Check for string quote start
-			if c in "'\"":
-				in_quote = c
-				
-				continue
+			if match.group(2) == b"}":
+				# yield Reader.BLOCK_END, None
+				return
 			
-			# Finalize word if it's been delimited
-			if c in " \t\n,;":
-				if word:
-					return word
-				
-				continue
+			# Treat ';' & ',' as delimiters until first character is found
+			words = [word.lstrip(",;") for word in self.decode(match.group(1)).split()]
+			words = [word for word in words if word]
 			
-			word += c
-		else:
-			raise XSIParseError(self.pos("Single Data Word Exceeded %d" % Reader.MAX_WORD))
+			yield (words[0] if words else None), words[1:]
+	
+	def parse_word(self):
+		match = Reader.RE_WORD.match(self.data, self.offset)
+		
+		# No more data in file (or a string quote which is never terminated)
+		if not match:
+			self.offset = self.size
+			return Reader.BLOCK_EOF
+		
+		self.offset = match.end()
+		
+		if match.lastindex == 4:
+			return match.group(4)
+		
+		# Word ended with a string quote, newlines inside quotes are dropped
+		return (match.group(1) + match.group(match.lastindex)).replace(b"\r", b"").replace(b"\n", b"")
 	
+	# Words are bytes, int() and float() take them as they are
 	def parse_type(self, data_type):
 			word = self.parse_word()
 			
 			if word == None:
 				raise XSIParseError(self.pos("Unexpected EOF"))
 			
+			if data_type is str:
+				return self.decode(word)
+			
 			try:
 				return data_type(word)
 			
 			except ValueError:
-				raise XSIParseError(self.pos("Expected %s, got %r" % (data_type.__name__, word)))
+				raise XSIParseError(self.pos("Expected %s, got %r" % (data_type.__name__, self.decode(word))))
 	
 	def parse_types(self, *read_as_data_type):
 		segments = []
@@ -534,22 +631,48 @@ class Reader:
 		
 		return segments
 	
+	# Parses (count) words of (data_type) with one regex scan, same results and errors as parse_types.
+	# (data_type) can also be a tuple of types which repeats over the words, like (int, float) for pairs.
+	def parse_bulk(self, data_type, count):
+		data_types = data_type if isinstance(data_type, tuple) else (data_type,)
+		count = max(count, 0) # Counts come from the file, negative ones read nothing like parse_types does
+		matches = list(Reader.islice(Reader.RE_DATA_WORD.finditer(self.data, self.offset), count))
+		words = [match.group(1) for match in matches]
+		
+		try:
+			if len(data_types) == 1:
+				values = list(map(data_type, words))
+			else:
+				values = list(words)
+				for index, item_type in enumerate(data_types):
+					values[index::len(data_types)] = map(item_type, words[index::len(data_types)])
+		except ValueError:
+			values = None
+		
+		# Let the word by word parser deal with quotes, bad values and EOF
+		if values is None or len(values) < count:
+			return self.parse_types(*data_types * (count // len(data_types)))
+		
+		if matches:
+			self.offset = matches[-1].end()
+		
+		return values
+	
+	# Every element of (vector) is expected to be the same data type
 	def parse_3d_data(self, vector=(float, float, float), faces_are_indexed=True):
-		vertices = []
-		for index in range(self.parse_type(Reader.int_float)):
-			vertices.append(self.parse_types(*vector))
+		# Vectors are stored as tuples, they are smaller than lists and are built in one pass by zip
+		values = self.parse_bulk(vector[0], self.parse_type(Reader.int_float) * len(vector))
+		vertices = list(zip(*[iter(values)] * len(vector)))
 		
 		faces = []
 		if faces_are_indexed:
 			for face_index in range(self.parse_type(Reader.int_float)):
-				index, count = self.parse_types(int, int)
-				vector = (int,) * count
-				faces.append(self.parse_types(*vector))
+				index, count = self.parse_bulk(int, 2)
+				faces.append(self.parse_bulk(int, count))
 		else:
 			for face_index in range(self.parse_type(Reader.int_float)):
 				count = self.parse_type(int)
-				vector = (int,) * count
-				faces.append(self.parse_types(*vector))
+				faces.append(self.parse_bulk(int, count))
 		
 		return vertices, faces
 	
@@ -557,14 +680,16 @@ class Reader:
 		depth = 1 # Only call skip_block if parser already parsed past initial '{' of block being skipped!
 		
 		while depth:
-			word = self.parse_word()
+			match = Reader.RE_SKIP_TO_BRACE.match(self.data, self.offset)
+			self.offset = match.end()
 			
-			if word == None:
+			if not match.group(1):
+				self.offset = self.size
 				return Reader.BLOCK_EOF # raise XSIParseError(self.pos("Unexpected EOF"))
 			
-			if word == "{":
+			if match.group(1) == b"{":
 				depth += 1
-			elif word == "}":
+			else:
 				depth -= 1
 		
 		return Reader.BLOCK_END
@@ -576,23 +701,10 @@ class Reader:
 			raise XSIParseError(self.pos("Invalid XSI Header %r" % header))
 		
 		for block_type, parameters in self.parse_block_headers():
-			if any(r.match(block_type) for r in self.re_skip):
-				self.skip_block()
+			handler = Reader.HANDLERS_ROOT.get(self.dispatch(Reader.DISPATCH_ROOT, block_type))
 			
-			elif Reader.RE_LIGHT.match(block_type):
-				self.read_light(self.xsi, parameters)
-			
-			elif Reader.RE_CAMERA.match(block_type):
-				self.read_camera(self.xsi, parameters)
-			
-			elif Reader.RE_FRAME.match(block_type):
-				self.read_frame(self.xsi, parameters)
-			
-			elif Reader.RE_ANIMATION_SET.match(block_type):
-				self.read_animation_set()
-			
-			elif Reader.RE_ENVELOPE_LIST.match(block_type):
-				self.read_envelope_list()
+			if handler:
+				handler(self, self.xsi, parameters)
 			
 			else:
 				if ALLOW_PRINT:
@@ -610,11 +722,12 @@ class Reader:
 		light_type = self.parse_type(Reader.int_float)
 		
 		if light_type == 0:
+			values = self.parse_bulk(float, 6)
 			parent_container.lights.append(
 				PointLight(
 					name=name,
-					rgb=self.parse_types(float, float, float),
-					location_xyz=self.parse_types(float, float, float)
+					rgb=values[0:3],
+					location_xyz=values[3:6]
 				)
 			)
 		
@@ -623,103 +736,95 @@ class Reader:
 	def read_camera(self, parent_container, parameters):
 		name = self.clean(parameters[0]) if parameters else Reader.UNNAMED_FRAME_NAME
 		
+		values = self.parse_bulk(float, 9)
 		parent_container.cameras.append(
 			Camera(
 				name=name,
-				location_xyz=self.parse_types(float, float, float),
-				look_at_xyz=self.parse_types(float, float, float),
-				roll=self.parse_type(float),
-				near_plane=self.parse_type(float),
-				far_plane=self.parse_type(float)
+				location_xyz=values[0:3],
+				look_at_xyz=values[3:6],
+				roll=values[6],
+				near_plane=values[7],
+				far_plane=values[8]
 			)
 		)
 		
 		self.skip_block()
 	
-	def read_frame(self, parent_frame, parameters):
+	def add_frame(self, parent_frame, parameters):
 		name = self.clean(parameters[0]) if parameters else Reader.UNNAMED_FRAME_NAME
 		
-		if RENAME_DUPLICATE_NAMED_FRAMES:
-			for index in range(9999):
-				if not name in self.xsi.frame_table:
-					break
-				
-				if ALLOW_PRINT:
-					print(self.pos("Duplicate Frame %r Renamed" % name))
-				name += "_"
-			else:
-				raise XSIParseError("Failed To Generate Unique Frame Name")
+		if RENAME_DUPLICATE_NAMED_FRAMES and name in self.xsi.frame_table:
+			# Duplicates are numbered "name.1", "name.2"..., counting on from the last number used for that name
+			base_name = name
+			number = self.name_counter.get(base_name, 1)
+			while "%s.%d" % (base_name, number) in self.xsi.frame_table:
+				number += 1
+			
+			self.name_counter[base_name] = number + 1
+			name = "%s.%d" % (base_name, number)
+			
+			if ALLOW_PRINT:
+				print(self.pos("Duplicate Frame %r Renamed To %r" % (base_name, name)))
 		
-		frame = parent_frame.add_frame(name)
+		return parent_frame.add_frame(name)
+	
+	def read_frame(self, parent_frame, parameters):
+		root_frame = self.add_frame(parent_frame, parameters)
 		
-		for block_type, parameters in self.parse_block_headers():
-			if any(r.match(block_type) for r in self.re_skip):
-				self.skip_block()
-			
-			elif Reader.RE_TRANSFORM_MATRIX.match(block_type):
-				frame.transform = self.read_matrix()
+		# Sub frames are read with an explicit stack of (frame, block headers) instead of recursion,
+		# a frame's headers continue where they left off once its sub frame's block is closed.
+		stack = [(root_frame, self.parse_block_headers())]
 		
-			elif Reader.RE_POSE_MATRIX.match(block_type):
-				frame.pose = self.read_matrix()
-			
-			elif Reader.RE_MESH.match(block_type):
-				frame.mesh = self.read_mesh()
+		while stack:
+			frame, block_headers = stack[-1]
 			
-			elif Reader.RE_FRAME.match(block_type):
-				self.read_frame(frame, parameters)
-			
-			# Sometimes XSI files might have unclosed braces for frames.
-			# In this scenario the animation set or envelope list may appear as a child of the last frame.
-			# Because these are non-hierarchical blocks we can just read them as if they were parsed globally
-			# outside of frames at root level.
-			elif Reader.RE_ANIMATION_SET.match(block_type):
-				self.read_animation_set()
-			
-			elif Reader.RE_ENVELOPE_LIST.match(block_type):
-				self.read_envelope_list()
-			
-			else:
-				if ALLOW_PRINT:
-					print(self.pos("Unknown Block %r In Frame %r" % (block_type, frame.name)))
+			for block_type, parameters in block_headers:
+				block = self.dispatch(Reader.DISPATCH_FRAME, block_type)
+				handler = Reader.HANDLERS_FRAME.get(block)
 				
-				self.skip_block()
+				if handler:
+					handler(self, frame, parameters)
+				
+				elif block == "frame":
+					stack.append((self.add_frame(frame, parameters), self.parse_block_headers()))
+					break
+				
+				else:
+					if ALLOW_PRINT:
+						print(self.pos("Unknown Block %r In Frame %r" % (block_type, frame.name)))
+					
+					self.skip_block()
+			else:
+				stack.pop()
 		
-		return frame
+		return root_frame
 	
 	def read_matrix(self):
-		matrix = Matrix(
-			self.parse_types(float, float, float, float),
-			self.parse_types(float, float, float, float),
-			self.parse_types(float, float, float, float),
-			self.parse_types(float, float, float, float)
-		)
+		values = self.parse_bulk(float, 16)
+		matrix = Matrix(values[0:4], values[4:8], values[8:12], values[12:16])
 		
 		self.skip_block()
 		return matrix
 	
+	def read_transform_matrix(self, frame, parameters):
+		frame.transform = self.read_matrix()
+	
+	def read_pose_matrix(self, frame, parameters):
+		frame.pose = self.read_matrix()
+	
+	def read_frame_mesh(self, frame, parameters):
+		frame.mesh = self.read_mesh()
+	
 	def read_mesh(self):
 		mesh = Mesh()
 		
 		mesh.vertices, mesh.faces = self.parse_3d_data((float, float, float), False)
 		
 		for block_type, parameters in self.parse_block_headers():
-			if any(r.match(block_type) for r in self.re_skip):
-				self.skip_block()
+			handler = Reader.HANDLERS_MESH.get(self.dispatch(Reader.DISPATCH_MESH, block_type))
 			
-			elif Reader.RE_MESH_MATERIALLIST.match(block_type):
-				self.read_material_list(mesh)
-			
-			elif Reader.RE_MESH_NORMALS.match(block_type):
-				mesh.normal_vertices, mesh.normal_faces = self.parse_3d_data((float, float, float), True)
-				self.skip_block()
-			
-			elif Reader.RE_MESH_UVMAP.match(block_type):
-				mesh.uv_vertices, mesh.uv_faces = self.parse_3d_data((float, float), True)
-				self.skip_block()
-			
-			elif Reader.RE_MESH_VERTEX_COLORS.match(block_type):
-				mesh.vertex_colors, mesh.vertex_color_faces = self.parse_3d_data((float, float, float, float), True)
-				self.skip_block()
+			if handler:
+				handler(self, mesh, parameters)
 			
 			else:
 				print(self.pos("Unknown Block %r In Mesh" % block_type))
@@ -727,14 +832,26 @@ class Reader:
 		
 		return mesh
 	
+	def read_mesh_normals(self, mesh, parameters):
+		mesh.normal_vertices, mesh.normal_faces = self.parse_3d_data((float, float, float), True)
+		self.skip_block()
+	
+	def read_mesh_uvmap(self, mesh, parameters):
+		mesh.uv_vertices, mesh.uv_faces = self.parse_3d_data((float, float), True)
+		self.skip_block()
+	
+	def read_mesh_vertex_colors(self, mesh, parameters):
+		mesh.vertex_colors, mesh.vertex_color_faces = self.parse_3d_data((float, float, float, float), True)
+		self.skip_block()
+	
 	def read_material_list(self, mesh):
 		material_count = self.parse_type(Reader.int_float)
 		material_face_count = self.parse_type(Reader.int_float)
-		material_face_indices = self.parse_types(*(int,) * material_face_count)
+		material_face_indices = self.parse_bulk(int, material_face_count)
 		materials = []
 		
 		for block_type, parameters in self.parse_block_headers():
-			if any(r.match(block_type) for r in self.re_skip):
+			if self.re_skip_any.match(block_type):
 				self.skip_block()
 			
 			elif Reader.RE_MESH_MATERIAL.match(block_type):
@@ -768,17 +885,18 @@ class Reader:
 			mesh.face_materials.append(materials[index])
 	
 	def read_material(self):
+		values = self.parse_bulk(float, 15)
 		material = Material(
-			diffuse      = self.parse_types(float, float, float, float),
-			hardness     = self.parse_type(float),
-			specular     = self.parse_types(float, float, float),
-			emissive     = self.parse_types(float, float, float),
-			shading_type = self.parse_type(Reader.int_float),
-			ambient      = self.parse_types(float, float, float)
+			diffuse      = values[0:4],
+			hardness     = values[4],
+			specular     = values[5:8],
+			emissive     = values[8:11],
+			shading_type = int(values[11]),
+			ambient      = values[12:15]
 		)
 		
 		for block_type, parameters in self.parse_block_headers():
-			if any(r.match(block_type) for r in self.re_skip):
+			if self.re_skip_any.match(block_type):
 				self.skip_block()
 			
 			elif Reader.RE_MESH_TEXTURE.match(block_type):
@@ -790,11 +908,12 @@ class Reader:
 					print("Unknown Block In Material %r" % block_type)
 				self.skip_block()
 		
-		return material
+		# Equal materials in the file share one instance
+		return self.materials.setdefault(material, material)
 	
 	def read_animation_set(self):
 		for block_type, parameters in self.parse_block_headers():
-			if any(r.match(block_type) for r in self.re_skip):
+			if self.re_skip_any.match(block_type):
 				self.skip_block()
 			
 			elif Reader.RE_ANIMATION.match(block_type):
@@ -809,15 +928,15 @@ class Reader:
 		name = self.clean(parameters[0]) if parameters else Reader.UNNAMED_FRAME_NAME
 		frame_name = self.clean(self.parse_type(str))
 		
-		if not frame_name in self.xsi.frame_table:
+		frame = self.xsi.frame_table.get(frame_name)
+		
+		if frame is None:
 			if ALLOW_PRINT:
 				print(self.pos("Invalid Frame %r Referenced By Animation %r" % (frame_name, name)))
 			self.skip_block()
 		else:
-			frame = self.xsi.frame_table[frame_name]
-			
 			for block_type, parameters in self.parse_block_headers():
-				if any(r.match(block_type) for r in self.re_skip):
+				if self.re_skip_any.match(block_type):
 					self.skip_block()
 				
 				elif Reader.RE_ANIMATION_KEY.match(block_type):
@@ -835,8 +954,7 @@ class Reader:
 			
 			for animation_index in range(key_count):
 				keyframe = self.parse_type(Reader.int_float)
-				vector = (float,) * self.parse_type(int)
-				key.add_key(keyframe, self.parse_types(*vector))
+				key.add_key(keyframe, self.parse_bulk(float, self.parse_type(int)))
 			
 			frame.animation_keys.append(key)
 		except ValueError as msg:
@@ -849,7 +967,7 @@ class Reader:
 		envelope_count = self.parse_type(Reader.int_float)
 		
 		for block_type, parameters in self.parse_block_headers():
-			if any(r.match(block_type) for r in self.re_skip):
+			if self.re_skip_any.match(block_type):
 				self.skip_block()
 			
 			elif Reader.RE_ENVELOPE.match(block_type):
@@ -870,37 +988,91 @@ class Reader:
 	def read_envelope(self):
 		frame_name = self.clean(self.parse_type(str))
 		bone_name  = self.clean(self.parse_type(str))
-		error_format = None
+		frame = self.xsi.frame_table.get(frame_name)
+		bone = self.xsi.frame_table.get(bone_name)
 		
-		if not frame_name in self.xsi.frame_table:
-			error_format = ("Frame", frame_name, "Bone", bone_name)
-			if ALLOW_PRINT:
-				print(self.pos("Invalid %s %r Used By Envelope For %s %r" % error_format))
+		if frame is None and ALLOW_PRINT:
+			print(self.pos("Invalid %s %r Used By Envelope For %s %r" % ("Frame", frame_name, "Bone", bone_name)))
 		
-		if not bone_name in self.xsi.frame_table:
-			error_format = ("Bone", bone_name, "Frame", frame_name)
-			if ALLOW_PRINT:
-				print(self.pos("Invalid %s %r Used By Envelope For %s %r" % error_format))
+		if bone is None and ALLOW_PRINT:
+			print(self.pos("Invalid %s %r Used By Envelope For %s %r" % ("Bone", bone_name, "Frame", frame_name)))
 		
-		if error_format:
+		if frame is None or bone is None:
 			self.skip_block()
 			return
 		
-		frame = self.xsi.frame_table[frame_name]
-		bone = self.xsi.frame_table[bone_name]
 		bone.is_bone = True
 		weight_count = self.parse_type(Reader.int_float)
 		envelope = frame.add_envelope(bone)
 		
-		for weight_index in range(weight_count):
-			envelope.add_weight(*self.parse_types(int, float))
+		values = self.parse_bulk((int, float), weight_count * 2)
+		envelope.vertices.extend(zip(values[0::2], values[1::2]))
 		
 		self.skip_block()
+	
+	# Handlers of (self, parent, parameters) for each alternative name matched by the DISPATCH_* patterns
+	HANDLERS_ROOT = {
+		"skip": lambda self, xsi, parameters: self.skip_block(),
+		"light": read_light,
+		"camera": read_camera,
+		"frame": read_frame,
+		"animation_set": lambda self, xsi, parameters: self.read_animation_set(),
+		"envelope_list": lambda self, xsi, parameters: self.read_envelope_list()
+	}
+	# Sub frames aren't handled here, read_frame() reads them with its stack instead.
+	# Sometimes XSI files might have unclosed braces for frames.
+	# In this scenario the animation set or envelope list may appear as a child of the last frame.
+	# Because these are non-hierarchical blocks we can just read them as if they were parsed globally
+	# outside of frames at root level.
+	HANDLERS_FRAME = {
+		"skip": HANDLERS_ROOT["skip"],
+		"transform_matrix": read_transform_matrix,
+		"pose_matrix": read_pose_matrix,
+		"mesh": read_frame_mesh,
+		"animation_set": HANDLERS_ROOT["animation_set"],
+		"envelope_list": HANDLERS_ROOT["envelope_list"]
+	}
+	HANDLERS_MESH = {
+		"skip": HANDLERS_ROOT["skip"],
+		"material_list": lambda self, mesh, parameters: self.read_material_list(mesh),
+		"normals": read_mesh_normals,
+		"uvmap": read_mesh_uvmap,
+		"vertex_colors": read_mesh_vertex_colors
+	}
+
+# str.translate table for Writer.get_safe_name, each character is checked once and the result kept
+class _SafeNameTable(dict):
+	ALLOWED = "QWERTYUIOPASDFGHJKLZXCVBNMqwertyuiopasdfghjklzxcvbnm1234567890_-"
+	
+	def __init__(self, sub):
+		self.sub = sub
+	
+	def __missing__(self, code):
+		self[code] = code if chr(code) in _SafeNameTable.ALLOWED else self.sub
+		return self[code]
+
+# The same frame and mesh names get sanitized over and over when writing, so results are cached
+@lru_cache(maxsize=4096)
+def _sanitize_name(name, sub):
+	table = Writer.SAFE_NAME_TABLES.get(sub)
+	if table is None:
+		table = Writer.SAFE_NAME_TABLES[sub] = _SafeNameTable(sub)
+	
+	return name.translate(table)
 
 class Writer:
+	TABS = tuple("\t" * t for t in range(32)) # Shared indentation strings, deep enough for nearly any hierarchy
+	SAFE_NAME_TABLES = {} # _SafeNameTable for each substitute string
+	
+	# Key format for each vector size, "keyframe;size;values;;"
+	ANIMATION_KEY_FORMATS = {
+		size: "%d;" + "%d;" % size + ";".join(["%f"] * size) + ";;" for size in set(AnimationKey.TYPE_SIZE)
+	}
+	
 	def __init__(self, bz2xsi_xsi, f):
 		self.xsi = bz2xsi_xsi
 		self.file = f
+		self.buffer = [] # Lines are collected here and written to (f) in one call at the end of write_xsi, (f) may be text or binary
 		
 		if f:
 			self.write_xsi()
@@ -913,62 +1085,78 @@ class Writer:
 			if ENABLE_NAME_WARNING:
 				print("XSI WRITER WARNING: Object with no name renamed to %r." % name)
 		
-		allowed = "QWERTYUIOPASDFGHJKLZXCVBNMqwertyuiopasdfghjklzxcvbnm1234567890_-"
-		new_name = "".join((c if c in allowed else sub) for c in name)
+		new_name = _sanitize_name(name, sub)
 		
 		if ENABLE_NAME_WARNING and new_name != name:
 			print("XSI WRITER WARNING: Object %r renamed to %r." % (new_name, name))
 		
 		return new_name
 	
+	def get_indent(self, t):
+		return Writer.TABS[t] if t < 32 else "\t" * t
+	
 	def write(self, t=0, data=""):
-		self.file.write("\t" * t + data + "\n")
+		self.buffer.extend((Writer.TABS[t] if t < 32 else "\t" * t, data, "\n"))
+	
+	# Array-like vector data (such as 2D numpy arrays) is converted to nested lists in one call rather than row by row
+	@staticmethod
+	def get_rows(vectors):
+		return vectors.tolist() if hasattr(vectors, "tolist") else vectors
+	
+	# Writes each of (lines) at indent (t) as one block, ending with "," except for the last which ends with ";"
+	def write_list(self, t, lines):
+		indent = self.get_indent(t)
+		self.buffer.extend((indent, (",\n" + indent).join(lines), ";\n"))
+	
+	# Same output as write_list for (count) lines of (format_string), but all (values) are formatted in a single % operation
+	def write_format_list(self, t, format_string, count, values):
+		indent = self.get_indent(t)
+		self.buffer.extend((indent, (",\n" + indent).join([format_string] * count) % tuple(values), ";\n"))
 	
 	def write_vector_list(self, t, format_string, vectors):
 		self.write(t, "%d;" % len(vectors))
-		if not vectors: return
+		if not len(vectors): return
 		
-		for vector in vectors[0:-1]:
-			self.write(t, format_string % tuple(vector) + ",")
-		else:
-			self.write(t, format_string % tuple(vectors[-1],) + ";")
+		self.write_format_list(t, format_string, len(vectors), chain.from_iterable(Writer.get_rows(vectors)))
 	
 	def write_face_list(self, t, faces, indexed=True):
-		def make_face(face):
-			return "%d;" % len(face) + ",".join(str(i) for i in face) + ";"
-		
 		self.write(t, "%d;" % len(faces))
-		if not faces: return
+		if not len(faces): return
+		
+		arities = set(map(len, faces))
+		
+		# All faces with the same number of vertices (e.g. all triangles) share one format string
+		if len(arities) == 1:
+			arity = arities.pop()
+			format_string = "%d;" % arity + ",".join(["%d"] * arity) + ";"
+			
+			if not indexed:
+				self.write_format_list(t, format_string, len(faces), chain.from_iterable(faces))
+			else:
+				self.write_format_list(t, "%d;" + format_string, len(faces), chain.from_iterable([(index, *face) for index, face in enumerate(faces)]))
 		
-		if not indexed:
-			for face in faces[0:-1]:
-				self.write(t, make_face(face) + ",")
-			self.write(t, make_face(faces[-1]) + ";")
+		elif not indexed:
+			self.write_list(t, ["%d;%s;" % (len(face), ",".join(map(str, face))) for face in faces])
 		else:
-			for index, face in enumerate(faces[0:-1]):
-				self.write(t, "%d;" % index + make_face(face) + ",")
-			self.write(t, "%d;" % (len(faces)-1) + make_face(faces[-1]) + ";")
+			self.write_list(t, ["%d;%d;%s;" % (index, len(face), ",".join(map(str, face))) for index, face in enumerate(faces)])
 	
 	def write_face_vertices(self, t, format_string, faces, vertices):
 		self.write(t, "%d;" % len(vertices))
-		if not vertices: return
+		if not len(vertices): return
+		
+		vertices = Writer.get_rows(vertices)
 		
+		# Every face's vertex list is terminated with ";"
 		for face in faces:
-			for index in face[0:-1]:
-				self.write(t, format_string % tuple(vertices[index]) + ",")
-			else:
-				self.write(t, format_string % tuple(vertices[face[-1]]) + ";")
+			self.write_format_list(t, format_string, len(face), chain.from_iterable([vertices[index] for index in face]))
 	
 	def write_animationkeys(self, t, keys):
 		self.write(t, "%d;" % len(keys))
 		if not keys: return
 		
-		vector_size = len(keys[0][1])
-		format_string = "%d;%d;" + ";".join(["%f"] * vector_size) + ";;%s"
+		format_string = Writer.ANIMATION_KEY_FORMATS[len(keys[0][1])]
 		
-		for keyframe, vector in keys[0:-1]:
-			self.write(t, format_string % (keyframe, vector_size, *vector, ","))
-		self.write(t, format_string % (keys[-1][0], vector_size, *keys[-1][1], ";"))
+		self.write_format_list(t, format_string, len(keys), chain.from_iterable([(keyframe, *vector) for keyframe, vector in keys]))
 	
 	def write_xsi(self):
 		self.write(0, "xsi 0101txt 0032\n")
@@ -986,7 +1174,10 @@ class Writer:
 			self.write()
 			self.write_frame(0, root_frame)
 		
-		animated_frames = tuple(self.xsi.get_animated_frames())
+		# Walk the hierarchy once, animation and envelope blocks are filtered from the same list
+		all_frames = tuple(self.xsi.get_all_frames())
+		animated_frames = tuple(frame for frame in all_frames if frame.animation_keys)
+		skinned_frames = tuple(frame for frame in all_frames if frame.envelopes)
 		
 		if animated_frames:
 			self.write(0, "\nAnimationSet {")
@@ -996,86 +1187,99 @@ class Writer:
 			
 			self.write(0, "}")
 		
-		skinned_frames = tuple(self.xsi.get_skinned_frames())
 		if skinned_frames:
 			self.write(0, "\nSI_EnvelopeList {")
-			self.write(1, "%d;" % self.xsi.get_envelope_count())
+			self.write(1, "%d;" % sum(len(frame.envelopes) for frame in skinned_frames))
 			
 			for frame in skinned_frames:
+				frame_name = self.get_safe_name(frame.name)
 				for envelope in frame.envelopes:
-					self.write_envelope(1, frame, envelope)
+					self.write_envelope(1, frame, envelope, frame_name)
 			
 			self.write(0, "}")
-	
-	def write_frame(self, t, frame):
-		self.write(t, "Frame frm-%s {" % self.get_safe_name(frame.name))
 		
-		if frame.transform:
-			self.write_matrix(t + 1, frame.transform, "FrameTransformMatrix")
+		document = "".join(self.buffer)
+		self.buffer.clear()
 		
-		if frame.pose:
-			self.write_matrix(t + 1, frame.pose, "SI_FrameBasePoseMatrix")
-		
-		if frame.mesh:
-			self.write_mesh(t + 1, frame.mesh, frame.mesh.name if frame.mesh.name else frame.name)
-		
-		for sub_frame in frame.frames:
-			self.write_frame(t + 1, sub_frame)
+		try:
+			self.file.write(document)
+		except TypeError: # Binary file, encoded once as a whole
+			self.file.write(document.encode(Reader.ENCODING))
+	
+	def write_frame(self, t, frame):
+		# Explicit stack instead of recursion, a (t, None) entry closes the frame block opened at depth (t)
+		stack = [(t, frame)]
 		
-		self.write(t, "}")
+		while stack:
+			t, frame = stack.pop()
+			
+			if frame is None:
+				self.write(t, "}")
+				continue
+			
+			self.write(t, "Frame frm-%s {" % self.get_safe_name(frame.name))
+			
+			if frame.transform:
+				self.write_matrix(t + 1, frame.transform, "FrameTransformMatrix")
+			
+			if frame.pose:
+				self.write_matrix(t + 1, frame.pose, "SI_FrameBasePoseMatrix")
+			
+			if frame.mesh:
+				self.write_mesh(t + 1, frame.mesh, frame.mesh.name if frame.mesh.name else frame.name)
+			
+			stack.append((t, None))
+			stack.extend((t + 1, sub_frame) for sub_frame in reversed(frame.frames))
 	
 	def write_matrix(self, t, matrix, block_name):
+		rows = ["%f,%f,%f,%f" % tuple(row) for row in (matrix.right, matrix.up, matrix.front, matrix.posit)]
+		rows[-1] += ";" # Matrix ends with ";;"
+		
 		self.write(t, block_name + " {")
-		self.write(t + 1, "%f,%f,%f,%f,"  % tuple(matrix.right))
-		self.write(t + 1, "%f,%f,%f,%f,"  % tuple(matrix.up))
-		self.write(t + 1, "%f,%f,%f,%f,"  % tuple(matrix.front))
-		self.write(t + 1, "%f,%f,%f,%f;;" % tuple(matrix.posit))
+		self.write_list(t + 1, rows)
 		self.write(t, "}")
 	
 	def write_mesh(self, t, mesh, name):
 		self.write(t, "Mesh %s {" % self.get_safe_name(name))
 		
-		if mesh.vertices:
+		if len(mesh.vertices):
 			self.write_vector_list(t + 1, "%f;%f;%f;", mesh.vertices)
 			
-			if mesh.faces:
+			if len(mesh.faces):
 				self.write_face_list(t + 1, mesh.faces, indexed = False)
 			
-			if mesh.face_materials and mesh.faces:
+			if mesh.face_materials and len(mesh.faces):
 				face_material_indices, materials = mesh.get_material_indices()
 				
 				self.write(t + 1, "MeshMaterialList {")
 				self.write(t + 2, "%d;" % len(materials))
 				self.write(t + 2, "%d;" % len(face_material_indices))
-				for index in face_material_indices[0:-1]:
-					self.write(t + 2, "%d," % index)
-				else:
-					self.write(t + 2, "%d;" % face_material_indices[-1])
+				self.write_list(t + 2, list(map(str, face_material_indices)))
 				
 				for material in materials:
 					self.write_material(t + 2, material)
 				
 				self.write(t + 1, "}")
 			
-			if mesh.normal_vertices:
+			if len(mesh.normal_vertices):
 				self.write(t + 1, "SI_MeshNormals {")
 				self.write_vector_list(t + 2, "%f;%f;%f;", mesh.normal_vertices)
 				
-				if mesh.normal_faces:
+				if len(mesh.normal_faces):
 					self.write_face_list(t + 2, mesh.normal_faces, indexed=True)
 				
 				self.write(t + 1, "}")
 			
-			if mesh.uv_vertices:
+			if len(mesh.uv_vertices):
 				self.write(t + 1, "SI_MeshTextureCoords {")
 				self.write_vector_list(t + 2, "%f;%f;", mesh.uv_vertices)
 				
-				if mesh.uv_faces:
+				if len(mesh.uv_faces):
 					self.write_face_list(t + 2, mesh.uv_faces, indexed=True)
 				
 				self.write(t + 1, "}")
 			
-			if mesh.vertex_colors and mesh.vertex_color_faces:
+			if len(mesh.vertex_colors) and len(mesh.vertex_color_faces):
 				self.write(t + 1, "SI_MeshVertexColors {")
 				self.write_face_vertices(
 					t + 2,
@@ -1089,13 +1293,14 @@ class Writer:
 		self.write(t, "}")
 	
 	def write_material(self, t, material):
+		# Material colors are always tuples (see Material.__init__), so they are formatted without copying
 		self.write(t, "SI_Material {")
-		self.write(t + 1, "%f;%f;%f;%f;;" % tuple(material.diffuse))
+		self.write(t + 1, "%f;%f;%f;%f;;" % material.diffuse)
 		self.write(t + 1, "%f;" % material.hardness)
-		self.write(t + 1, "%f;%f;%f;;" % tuple(material.specular))
-		self.write(t + 1, "%f;%f;%f;;" % tuple(material.emissive))
+		self.write(t + 1, "%f;%f;%f;;" % material.specular)
+		self.write(t + 1, "%f;%f;%f;;" % material.emissive)
 		self.write(t + 1, "%d;" % material.shading_type)
-		self.write(t + 1, "%f;%f;%f;;" % tuple(material.ambient))
+		self.write(t + 1, "%f;%f;%f;;" % material.ambient)
 		
 		if material.texture:
 			self.write(t + 1, "SI_Texture2D {")
@@ -1105,8 +1310,9 @@ class Writer:
 		self.write(t, "}")
 	
 	def write_animation(self, t, frame):
-		self.write(t, "Animation anim-%s {" % self.get_safe_name(frame.name))
-		self.write(t + 1, "{frm-%s}" % self.get_safe_name(frame.name))
+		frame_name = self.get_safe_name(frame.name)
+		self.write(t, "Animation anim-%s {" % frame_name)
+		self.write(t + 1, "{frm-%s}" % frame_name)
 		
 		for anim_key in frame.animation_keys:
 			self.write(t + 1, "SI_AnimationKey {")
@@ -1116,15 +1322,19 @@ class Writer:
 		
 		self.write(t, "}")
 	
-	def write_envelope(self, t, frame, envelope):
+	# (frame_name) is the already sanitized name of (frame), shared by all of its envelopes
+	def write_envelope(self, t, frame, envelope, frame_name=None):
+		if frame_name is None:
+			frame_name = self.get_safe_name(frame.name)
+		
 		self.write(t, "SI_Envelope {")
-		self.write(t + 1, "\"frm-%s\";" % self.get_safe_name(frame.name))
+		self.write(t + 1, "\"frm-%s\";" % frame_name)
 		self.write(t + 1, "\"frm-%s\";" % self.get_safe_name(envelope.bone.name))
 		self.write_vector_list(t + 1, "%d;%f;", envelope.vertices)
 		self.write(t, "}")
 
 def read(filepath, regex_skip_types=None):
-	with open(filepath, "r") as f:
+	with open(filepath, "rb") as f:
 		if regex_skip_types == None:
 			reader = Reader(f, bz2xsi_xsi=None, log_name=filepath) # Use defaults
 		else:
@@ -1,10 +1,11 @@
 import bpy
+import numpy as np
 from mathutils import Matrix, Vector
 
 from . import bz2xsi
 
 # Normals changed in 4.1 from 4.0
-OLD_NORMALS = not (bpy.app.version[0] >= 4 and bpy.app.version[1] >= 1)
+OLD_NORMALS = bpy.app.version < (4, 1, 0)
 
 USE_FRAME_NAME_AS_MESH_NAME = True
 ALLOW_MESH_WITH_NO_FACES = False
@@ -117,40 +118,41 @@ def generate_bone_mesh(bone, posebone):
 
 def get_keyframes_filtered(action, keyframe_filter):
 	filtered_points = {key: [] for key in keyframe_filter}
+	seen_positions = {key: set() for key in keyframe_filter} # Only the first point at each whole frame is kept
 	key_min, key_max = tuple(action.frame_range)
 	
 	for fcurve in action.fcurves:
-		if not fcurve.data_path in keyframe_filter:
+		data_path = fcurve.data_path
+		if not data_path in filtered_points: # Dict lookup, (keyframe_filter) can be any iterable
 			continue
 		
+		points, seen = filtered_points[data_path], seen_positions[data_path]
 		for point in fcurve.keyframe_points:
 			pos = int(point.co[0])
 			
-			if point.co[0] in filtered_points[fcurve.data_path]:
+			if not (key_min <= pos <= key_max) or pos in seen:
 				continue
 			
-			if pos >= key_min and pos <= key_max:
-				filtered_points[fcurve.data_path].append(point)
+			seen.add(pos)
+			points.append(point)
 
 	return filtered_points
 
 # Returns dictionary of {Bone Name: [(Vert Index, Vert Weight)...]}
 def get_vertex_weights(obj, group_names=None):
 	vertex_weights = {}
-	name_by_index = {}
-	indices_used = []
+	weights_by_index = {} # Group index to the same weight list stored in vertex_weights
 	
 	for vertex_group in obj.vertex_groups:
 		if group_names == None or vertex_group.name in group_names:
-			name_by_index[vertex_group.index] = vertex_group.name
-			vertex_weights[vertex_group.name] = []
-			indices_used.append(vertex_group.index)
+			weights_by_index[vertex_group.index] = vertex_weights[vertex_group.name] = []
 	
 	for vertex in obj.data.vertices:
+		vertex_index = vertex.index
 		for group in vertex.groups:
-			if group.group in indices_used:
-				name = name_by_index[group.group]
-				vertex_weights[name].append((vertex.index, group.weight * 100.0))
+			weights = weights_by_index.get(group.group)
+			if weights is not None:
+				weights.append((vertex_index, group.weight * 100.0))
 	
 	return vertex_weights
 
@@ -167,12 +169,20 @@ def get_armature(bpy_obj):
 	return armature_mod
 
 def obj_hierarchy_to_linear(bpy_objects):
-	for bpy_obj in bpy_objects:
-		for bpy_subobj in bpy_obj.children:
-			if bpy_subobj.type in ALLOWED_SUB_OBJECTS:
-				yield bpy_subobj
-			
-			yield from obj_hierarchy_to_linear([bpy_subobj])
+	# Depth-first in the same order as a recursive walk, with a stack of child iterators instead of nested generators
+	stack = [iter(bpy_obj.children) for bpy_obj in reversed(bpy_objects)]
+	
+	while stack:
+		bpy_subobj = next(stack[-1], None)
+		
+		if bpy_subobj is None:
+			stack.pop()
+			continue
+		
+		if bpy_subobj.type in ALLOWED_SUB_OBJECTS:
+			yield bpy_subobj
+		
+		stack.append(iter(bpy_subobj.children))
 
 class Save:
 	def __init__(self, operator, context, filepath="", **opt):
@@ -197,12 +207,20 @@ class Save:
 			print("XSI Warning: BZ2 does not support more than 1 root-level object:", ", ".join(obj.name for obj in objects))
 
 		self.referenced_objects = objects + list(obj_hierarchy_to_linear(objects))
+		
+		# Objects deformed by an armature which is also being exported, resolved once instead of per frame
+		self.skinned_objects = set()
+		if opt["export_envelopes"]:
+			referenced_object_set = set(self.referenced_objects)
+			armature_by_object = {obj: get_armature(obj) for obj in self.referenced_objects}
+			self.skinned_objects = {obj for obj, armature in armature_by_object.items() if armature in referenced_object_set}
+		
 		self.enveloped_bz2frames = {}
 		self.bone_name_to_bz2frame = {}
 		
 		for obj in objects:
 			if obj.type in ALLOWED_SUB_OBJECTS:
-				self.bz2xsi_xsi.frames += [self.object_to_bz2frame(obj, is_root_level=True)]
+				self.bz2xsi_xsi.frames.append(self.object_to_bz2frame(obj, is_root_level=True))
 		
 		# Envelopes for bones
 		if opt["export_envelopes"]:
@@ -249,12 +267,12 @@ class Save:
 		)
 	
 	def matrix_to_bz2matrix(self, local_matrix):
-		return bz2xsi.Matrix(*list(tuple(row) for row in tuple(local_matrix.transposed())))
+		return bz2xsi.Matrix(*[row[:] for row in local_matrix.transposed()]) # Vector slices are tuples
 	
 	def object_to_bz2frame(self, obj, is_root_level=False):
 		bz2frame = bz2xsi.Frame(obj.name)
 		bz2frame.mesh = None
-		is_skinned = self.opt["export_envelopes"] and get_armature(obj) in self.referenced_objects
+		is_skinned = obj in self.skinned_objects
 
 		if is_root_level and self.opt["zero_root_transforms"]:
 			bz2frame.transform = bz2xsi.Matrix()
@@ -265,13 +283,15 @@ class Save:
 			bz2frame.pose = bz2frame.transform
 		
 		obj_eval = obj.evaluated_get(self.depsgraph)
+		obj_type = obj.type
 		data = obj_eval.data
+		animation_data = obj_eval.animation_data
 		
 		scale = obj_eval.matrix_local.to_scale()
 		if scale != Vector((1.0, 1.0, 1.0)):
 			print("XSI Warning: Scaling information %r contained in object %r is not supported by BZ2." % (scale, obj.name))
 		
-		if obj.type == "MESH" and not len(data.vertices) <= 0:
+		if obj_type == "MESH" and not len(data.vertices) <= 0:
 			if not ALLOW_MESH_WITH_NO_FACES and len(data.polygons) <= 0:
 				print("XSI Warning: Mesh for object %r has no faces, ignoring mesh data." % obj.name)
 			
@@ -282,75 +302,74 @@ class Save:
 					if is_skinned:
 						self.enveloped_bz2frames[bz2frame] = obj_eval
 		
-		elif obj.type == "ARMATURE":
-			for bone, posebone in zip(obj_eval.data.bones, obj_eval.pose.bones):
+		elif obj_type == "ARMATURE":
+			for bone in data.bones:
 				if not bone.parent:
-					bz2frame.frames += [self.bone_to_bz2frame(bone, posebone, obj_eval)]
+					bz2frame.frames.append(self.bone_to_bz2frame(bone, obj_eval))
 		
 		# All other supported blender types are treated as empty objects by default below.
 		elif self.opt["generate_empty_mesh"]:
 			bz2frame.mesh = generate_pointer_mesh()
 			bz2frame.mesh.name = bz2frame.name
 		
-		if self.opt["export_animations"] and obj_eval.animation_data and obj_eval.animation_data.action:
-			bz2_animations = list(self.animation_to_bz2anim(obj_eval))
-			
-			if is_root_level and not ALLOW_ROOT_LEVEL_ANIMS:
-				bz2_animations = []
+		# Root-level animations are not sampled at all when they would be discarded
+		if self.opt["export_animations"] and animation_data and animation_data.action and (ALLOW_ROOT_LEVEL_ANIMS or not is_root_level):
+			bz2_animations = self.animation_to_bz2anim(obj_eval)
 			
 			if bz2_animations:
 				if is_root_level:
 					print("XSI Warning: Root-level object %r animation data may not behave as expected in BZ2." % obj.name)
 				
-				bz2frame.animation_keys += list(self.animation_to_bz2anim(obj_eval))
+				bz2frame.animation_keys += bz2_animations
 		
-		for obj in obj.children:
-			if obj.type in ALLOWED_SUB_OBJECTS:
-				bz2frame.frames += [self.object_to_bz2frame(obj)]
+		for child in obj.children:
+			if child.type in ALLOWED_SUB_OBJECTS:
+				bz2frame.frames.append(self.object_to_bz2frame(child))
 		
 		return bz2frame
 	
+	# Converts filtered keyframe points to bz2 keyframe animations, one for each path with points.
+	# The scene is set to each keyframe position only once, (get_matrix) is then sampled for every path keyed there.
+	def keyframes_to_bz2anims(self, filtered_keyframe_points, location_path, get_matrix):
+		positions = {key_type: {int(point.co[0]) for point in points} for key_type, points in filtered_keyframe_points.items() if points}
+		bz2anims = {key_type: bz2xsi.AnimationKey(2 if key_type == location_path else 0) for key_type in positions}
+		
+		for pos in sorted(set().union(*positions.values())):
+			bpy.context.scene.frame_set(pos)
+			matrix = get_matrix()
+			
+			for key_type, bz2anim in bz2anims.items():
+				if not pos in positions[key_type]:
+					continue
+				
+				if bz2anim.key_type == 2:
+					bz2anim.add_key(pos, tuple(matrix.to_translation()))
+				elif bz2anim.key_type == 0:
+					bz2anim.add_key(pos, tuple(matrix.transposed().to_quaternion()))
+		
+		return list(bz2anims.values())
+	
 	def animation_to_bz2anim(self, obj):
 		filtered_keyframe_points = get_keyframes_filtered(obj.animation_data.action, KEYFRAME_PATHS)
 		
-		# Convert the filtered keyframe points to bz2 keyframe animations
-		for key_type, points in filtered_keyframe_points.items():
-			bz2_keyframe_type = 2 if key_type == "location" else 0
-			
-			if not points:
-				continue
-			
-			bz2anim = bz2xsi.AnimationKey(bz2_keyframe_type)
-			
-			for point in points:
-				#~ bpy.context.scene.frame_set(point.co[0])
-				pos = int(point.co[0])
-				bpy.context.scene.frame_set(pos)
-				
-				if bz2_keyframe_type == 2:
-					bz2anim.add_key(pos, tuple(Matrix(obj.matrix_local).to_translation()))
-				elif bz2_keyframe_type == 0:
-					bz2anim.add_key(pos, tuple(Matrix(obj.matrix_local).transposed().to_quaternion()))
-
-			yield bz2anim
+		return self.keyframes_to_bz2anims(filtered_keyframe_points, "location", lambda: Matrix(obj.matrix_local))
 	
-	def bone_to_bz2frame(self, bone, posebone, armature):
+	def bone_to_bz2frame(self, bone, armature):
+		posebone = armature.pose.bones[bone.name] # Matched by name, pose bone order is not guaranteed to follow the bone hierarchy
 		bz2frame = bz2xsi.Frame(bone.name)
 		bz2frame.is_bone = True
 		self.bone_name_to_bz2frame[bone.name] = bz2frame
 		
-		matrix = Matrix()
-
 		if bone.parent:
-			matrix @= Matrix(bone.parent.matrix_local).inverted()
-		
-		matrix @= Matrix(bone.matrix_local)
+			matrix = bone.parent.matrix_local.inverted() @ bone.matrix_local
+		else:
+			matrix = bone.matrix_local
 
 		bz2frame.transform = self.matrix_to_bz2matrix(matrix)
 		bz2frame.pose = bz2frame.transform
 		
-		for child_bone, child_posebone in zip(bone.children, posebone.children):
-			bz2frame.frames += [self.bone_to_bz2frame(child_bone, child_posebone, armature)]
+		for child_bone in bone.children:
+			bz2frame.frames.append(self.bone_to_bz2frame(child_bone, armature))
 		
 		if self.opt["generate_bone_mesh"]:
 			bz2frame.mesh = generate_bone_mesh(bone, posebone)
@@ -358,63 +377,52 @@ class Save:
 		
 		if self.opt["export_animations"]:
 			if armature.animation_data and armature.animation_data.action:
-				bz2frame.animation_keys += list(self.bone_animation_to_bz2anim(bone, posebone, armature))
+				bz2frame.animation_keys += self.bone_animation_to_bz2anim(bone, posebone, armature)
 
 		return bz2frame
 	
 	def bone_animation_to_bz2anim(self, bone, posebone, armature):
 		# fcurves will be in the armature object, not in the bone object.
-		keyframe_filter = ["pose.bones[\"%s\"].%s" % (bone.name, path) for path in KEYFRAME_PATHS]
+		keyframe_filter = frozenset("pose.bones[\"%s\"].%s" % (bone.name, path) for path in KEYFRAME_PATHS)
 		filtered_keyframe_points = get_keyframes_filtered(armature.animation_data.action, keyframe_filter)
 		
-		# Convert the filtered keyframe points to bz2 keyframe animations
-		location_path_name = "pose.bones[\"%s\"].location" % bone.name
-		for key_type, points in filtered_keyframe_points.items():
-			bz2_keyframe_type = 2 if key_type == location_path_name else 0
-			
-			if not points:
-				continue
+		# Pose matrices are only read here, so they are used directly rather than copied into new Matrix objects
+		def get_matrix():
+			if posebone.parent:
+				return posebone.parent.matrix.inverted() @ posebone.matrix
 			
-			bz2anim = bz2xsi.AnimationKey(bz2_keyframe_type)
-			
-			for point in points:
-				#~ bpy.context.scene.frame_set(point.co[0])
-				pos = int(point.co[0])
-				bpy.context.scene.frame_set(pos)
-				
-				if posebone.parent:
-					matrix = Matrix(posebone.parent.matrix).inverted()
-					matrix @= Matrix(posebone.matrix)
-				else:
-					matrix = Matrix(posebone.matrix)
-				
-				if bz2_keyframe_type == 2:
-					bz2anim.add_key(pos, tuple(matrix.to_translation()))
-				
-				elif bz2_keyframe_type == 0:
-					bz2anim.add_key(pos, tuple(matrix.transposed().to_quaternion()))
-
-			yield bz2anim
+			return posebone.matrix
+		
+		location_path_name = "pose.bones[\"%s\"].location" % bone.name
+		return self.keyframes_to_bz2anims(filtered_keyframe_points, location_path_name, get_matrix)
 	
 	def mesh_to_bz2mesh(self, data, name=None):
 		bz2mesh = bz2xsi.Mesh(name if name else data.name)
-		if OLD_NORMALS:
+		export_normals = self.opt.get("export_mesh_normals", True)
+		if export_normals and OLD_NORMALS:
 			data.calc_normals_split()
 		bz2materials = []
 		
 		if self.opt["export_mesh_materials"]:
-			for material in data.materials:
-				bz2materials += [self.material_to_bz2material(material)]
+			bz2materials = [self.material_to_bz2material(material) for material in data.materials]
+		
+		# Mesh data is copied out in bulk with foreach_get rather than element by element,
+		# vector data is kept as (N, width) float32 arrays which the bz2xsi Writer accepts directly
+		def get_array(collection, attribute, dtype, width=1):
+			array = np.empty(len(collection) * width, dtype=dtype)
+			collection.foreach_get(attribute, array)
+			return array.reshape(-1, width) if width > 1 else array
+		
+		bz2mesh.vertices = get_array(data.vertices, "co", np.float32, 3)
 		
-		for vertex in data.vertices:
-			bz2mesh.vertices += [tuple(vertex.co.xyz)]
+		loop_starts = get_array(data.polygons, "loop_start", np.int32).tolist()
+		loop_totals = get_array(data.polygons, "loop_total", np.int32).tolist()
+		loop_vertices = get_array(data.loops, "vertex_index", np.int32).tolist()
 		
-		for polygon in data.polygons:
-			bz2mesh.faces += [tuple(polygon.vertices)]
+		bz2mesh.faces = [tuple(loop_vertices[start:start + total]) for start, total in zip(loop_starts, loop_totals)]
 		
 		if bz2materials:
-			for polygon in data.polygons:
-				bz2mesh.face_materials += [bz2materials[polygon.material_index]]
+			bz2mesh.face_materials = [bz2materials[index] for index in get_array(data.polygons, "material_index", np.int32).tolist()]
 		
 		elif not ALLOW_MESH_WITH_NO_MATERIAL:
 			print("XSI Warning: Mesh %r has no materials, adding default material." % name)
@@ -425,26 +433,23 @@ class Save:
 		active_color_layer = data.vertex_colors.active
 		color_layer = active_color_layer.data if active_color_layer else None
 		
-		# Normals and mesh loop faces (loop indices shared for uv and vert colors)
-		for polygon in data.polygons:
-			for loop_index in polygon.loop_indices:
-				bz2mesh.normal_vertices += [tuple(data.loops[loop_index].normal)]
-			
-			bz2mesh.normal_faces += [tuple(polygon.loop_indices)]
+		# Mesh loop faces (loop indices shared for normals, uv and vert colors)
+		loop_faces = [tuple(range(start, start + total)) for start, total in zip(loop_starts, loop_totals)]
+		
+		if export_normals:
+			if OLD_NORMALS:
+				bz2mesh.normal_vertices = get_array(data.loops, "normal", np.float32, 3)
+			else:
+				bz2mesh.normal_vertices = get_array(data.corner_normals, "vector", np.float32, 3)
+			bz2mesh.normal_faces = loop_faces
 		
 		if uv_layer and self.opt["export_mesh_uvmap"]:
-			for poly in data.polygons:
-				for loop_index in poly.loop_indices:
-					bz2mesh.uv_vertices += [tuple(uv_layer[loop_index].uv)]
-			
-			bz2mesh.uv_faces = bz2mesh.normal_faces
+			bz2mesh.uv_vertices = get_array(uv_layer, "uv", np.float32, 2)
+			bz2mesh.uv_faces = loop_faces
 		
 		if color_layer and self.opt["export_mesh_vertcolor"]:
-			for poly in data.polygons:
-				for loop_index in poly.loop_indices:
-					bz2mesh.vertex_colors += [tuple(color_layer[loop_index].color)]
-			
-			bz2mesh.vertex_color_faces = bz2mesh.normal_faces
+			bz2mesh.vertex_colors = get_array(color_layer, "color", np.float32, 4)
+			bz2mesh.vertex_color_faces = loop_faces
 		
 		return bz2mesh
 
@@ -4,31 +4,76 @@ from bpy_extras import image_utils
 
 from . import bz2xsi
 from math import radians, floor, ceil
+from functools import lru_cache
+from contextlib import nullcontext
+from itertools import chain
+import numpy as np
 import os
 
 DEBUGGING_BONES = False
 
 # Normals changed in 4.1 from 4.0
-OLD_NORMALS = not (bpy.app.version[0] >= 4 and bpy.app.version[1] >= 1)
+OLD_NORMALS = bpy.app.version < (4, 1, 0)
 
 class InvalidXSI(Exception): pass
 class UnsupportedAnim(InvalidXSI): pass
 
-def find_texture(texture_filepath, search_directories, acceptable_extensions, recursive=False):
-	acceptable_extensions = list(acceptable_extensions)
+# Lazy index of {Lowercase File Name Without Extension: {Lowercase Extension: File Path}} for recursive image search.
+# Directories are only walked on the first lookup, and again only for extensions that weren't indexed yet.
+# The first file found (in search_directories order) is kept for each name and extension.
+class TextureIndex:
+	def __init__(self, search_directories, recursive=False):
+		self.search_directories = [directory for directory in search_directories if directory]
+		self.recursive = recursive
+		self.indexed_exts = set()
+		self.paths = {}
 	
+	def get(self, file_name, acceptable_extensions):
+		missing_exts = {ext.lower() for ext in acceptable_extensions} - self.indexed_exts
+		
+		if missing_exts:
+			self.index_exts(missing_exts)
+		
+		return self.paths.get(file_name.lower(), {})
+	
+	def index_exts(self, exts):
+		for directory in self.search_directories:
+			for root, folders, files in os.walk(directory):
+				for file in files:
+					file_name, ext = os.path.splitext(file)
+					ext = ext.lower()
+					
+					if ext in exts:
+						self.paths.setdefault(file_name.lower(), {}).setdefault(ext, os.path.join(root, file))
+				
+				if not self.recursive:
+					break
+		
+		self.indexed_exts |= exts
+
+def find_texture(texture_filepath, search_directories, acceptable_extensions, recursive=False, texture_index=None):
 	if os.path.exists(texture_filepath):
 		return texture_filepath
 	
 	file_name, original_extension = os.path.splitext(os.path.basename(texture_filepath))
 	
+	if not file_name:
+		return file_name + original_extension
+	
+	# Originally specified extension will be searched for first, and removed from the others so we don't look twice
 	original_extension_compare = original_extension.lower()
-	while original_extension_compare in acceptable_extensions:
-		# Remove if already present, so we don't look twice
-		del acceptable_extensions[acceptable_extensions.index(original_extension_compare)]
+	acceptable_extensions = [original_extension] + [ext for ext in acceptable_extensions if ext != original_extension_compare]
 	
-	# Originally specified extension will be searched for first
-	acceptable_extensions = [original_extension] + acceptable_extensions
+	# Shared directory index avoids walking the search directories for every texture
+	if texture_index is not None:
+		paths = texture_index.get(file_name, acceptable_extensions)
+		
+		for ext in acceptable_extensions:
+			path = paths.get(ext.lower())
+			if path:
+				return path
+		
+		return file_name + original_extension
 	
 	for ext in acceptable_extensions:
 		for directory in search_directories:
@@ -44,21 +89,74 @@ def find_texture(texture_filepath, search_directories, acceptable_extensions, re
 	# Return as-is by default
 	return file_name + original_extension
 
-def flags_from_name(name):
-	flags = name.split("__")
-	flags = flags[-1].casefold() if len(flags) >= 2 else ""
-	first_name = name.split("_")[0].casefold()
+# Returns a flat float32 array of (width) values for each of (loop_count) mesh loops, for use with foreach_set.
+# (vectors) are gathered through the loop indices in (faces) if there are any, otherwise taken in order.
+# Loops without data are left at (fill), extra data is ignored.
+# The result is written to (out) if given, a float32 buffer of at least (loop_count * width) values.
+def loop_data_to_array(vectors, faces, loop_count, width, fill=0.0, out=None):
+	vectors = np.asarray(vectors, dtype=np.float32)
 	
-	if first_name == "flame":
-		flags += "IFe" # "F" = special flame
+	if faces:
+		vectors = vectors[np.fromiter(chain.from_iterable(faces), dtype=np.intp)]
 	
-	elif first_name == "hp":
-		flags += "h"
+	if out is None:
+		out = np.empty(loop_count * width, dtype=np.float32)
 	
-	elif first_name == "tractor":
-		flags += "I" # "I" = ignore hidden flag
+	array = out[:loop_count * width].reshape(loop_count, width)
+	array.fill(fill)
+	count = min(loop_count, len(vectors))
+	array[:count, :vectors.shape[1]] = vectors[:count, :width]
 	
-	return flags
+	return array.ravel()
+
+# Hamilton product of WXYZ quaternion arrays, (a) and (b) broadcast against each other
+def quaternion_multiply(a, b):
+	aw, ax, ay, az = np.moveaxis(a, -1, 0)
+	bw, bx, by, bz = np.moveaxis(b, -1, 0)
+	
+	return np.stack((
+		aw * bw - ax * bx - ay * by - az * bz,
+		aw * bx + ax * bw + ay * bz - az * by,
+		aw * by - ax * bz + ay * bw + az * bx,
+		aw * bz + ax * by - ay * bx + az * bw
+	), axis=-1)
+
+# Frame name flags, as bits of the value returned by flags_from_name()
+FLAG_DOUBLE_SIDED  = 1 << 0 # "2"
+FLAG_HARDPOINT     = 1 << 1 # "h"
+FLAG_COLLISION     = 1 << 2 # "c"
+FLAG_EMISSIVE      = 1 << 3 # "e"
+FLAG_GLOW          = 1 << 4 # "g"
+FLAG_IGNORE_HIDDEN = 1 << 5 # "I"
+FLAG_FLAME         = 1 << 6 # "F", special flame
+
+FLAG_BITS = {
+	"2": FLAG_DOUBLE_SIDED,
+	"h": FLAG_HARDPOINT,
+	"c": FLAG_COLLISION,
+	"e": FLAG_EMISSIVE,
+	"g": FLAG_GLOW,
+	"I": FLAG_IGNORE_HIDDEN,
+	"F": FLAG_FLAME
+}
+
+# Flags implied by the first "_" separated part of a frame name
+PREFIX_FLAGS = {
+	"flame": FLAG_IGNORE_HIDDEN | FLAG_FLAME | FLAG_EMISSIVE,
+	"hp": FLAG_HARDPOINT,
+	"tractor": FLAG_IGNORE_HIDDEN
+}
+
+@lru_cache(maxsize=4096) # Frame names and their prefixes repeat a lot
+def flags_from_name(name):
+	flag_bits = PREFIX_FLAGS.get(name.partition("_")[0].casefold(), 0)
+	
+	# Flags after the last "__" of the name
+	if "__" in name:
+		for flag in name.rpartition("__")[2].casefold():
+			flag_bits |= FLAG_BITS.get(flag, 0)
+	
+	return flag_bits
 
 class Load:
 	def __init__(self, operator, context, filepath="", **opt):
@@ -67,13 +165,17 @@ class Load:
 		
 		self.name = os.path.basename(filepath)
 		self.filefolder = os.path.dirname(filepath)
-		self.ext_list = self.opt["find_textures_ext"].casefold().split()
-		self.tex_dir = self.context.preferences.filepaths.texture_directory
+		self.ext_list = self.opt["texture_exts"]
+		self.tex_dir = bpy.path.abspath(self.context.preferences.filepaths.texture_directory) # Default is "//", relative to the .blend
+		self.texture_index = self.opt.get("texture_index")
+		self.loop_buffer = np.empty(0, dtype=np.float32) # See get_loop_buffer()
+		self.material_templates = {} # {(use_vcol, use_texture, emissive, double_sided, is_chrome): First bpy material built with those}
 		
 		self.bpy_armature = None		
 		
+		self.bone_frames = [] # (xsi_frame, bpy_obj) of every bone, parents before children, see create_editbone()
+		
 		# Note: we are assuming unique frame names using these.
-		self.bpy_obj_of_bone = {}
 		self.animated_bones = set()
 		self.animated_objects = []
 		
@@ -88,23 +190,27 @@ class Load:
 		
 		if self.opt["import_lights"]:
 			for xsi_light in bz2_xsi.lights:
-				bpy_root_objects += [self.import_light(xsi_light)]
+				bpy_root_objects.append(self.import_light(xsi_light))
 		
 		if self.opt["import_cameras"]:
 			for xsi_camera in bz2_xsi.cameras:
-				bpy_root_objects += [*self.import_camera(xsi_camera)]
+				bpy_root_objects.extend(self.import_camera(xsi_camera))
 		
 		if self.opt["import_envelopes"] and bz2_xsi.is_skinned():
-			self.bpy_armature = bpy.data.objects.new(self.name, bpy.data.armatures.new(self.name))
-			self.context.view_layer.active_layer_collection.collection.objects.link(self.bpy_armature)
+			self.bpy_armature = bpy.data.objects.new(self.name, bpy.data.armatures.new(self.name)) # Linked by link_objects()
 		
 		for xsi_frame in bz2_xsi.frames:
-			bpy_root_objects += [self.walk(xsi_frame)]
+			bpy_root_objects.append(self.walk(xsi_frame))
 		
-		if self.bpy_armature:
+		# Objects are linked in one pass rather than as each is created, so the scene is only updated once
+		self.link_objects()
+		
+		# Edit mode is only entered when there are bones to create
+		if self.bpy_armature and self.bone_frames:
+			self.context.view_layer.update() # create_editbone() needs the world matrices of the linked bone objects
+			
 			# Blender offers no other way to create bones than using bpy.ops.
 			# This requires us to switch object modes to create 'edit' bones.
-			# If any exceptions occur after this blender will be left in edit mode.
 			self.bpy_armature.select_set(True)
 			self.context.view_layer.objects.active = self.bpy_armature
 			
@@ -113,14 +219,26 @@ class Load:
 				self.bpy_armature.data.show_axes = True 
 				self.bpy_armature.data.axes_position = 0.0 # 1.0 for tail, 0.0 for head
 			
-			bpy.ops.object.mode_set(mode="EDIT")
-			
-			for xsi_frame in bz2_xsi.frames:
-				self.walk_skel(xsi_frame)
+			# The mode switch only needs the armature in context, rather than whatever the window has
+			if hasattr(self.context, "temp_override"):
+				context_override = self.context.temp_override(active_object=self.bpy_armature, object=self.bpy_armature, selected_objects=[self.bpy_armature])
+			else:
+				context_override = nullcontext()
 			
-			bpy.ops.object.mode_set(mode="OBJECT")
+			with context_override:
+				bpy.ops.object.mode_set(mode="EDIT")
+				
+				try:
+					# Bones were collected by walk(), so the frame hierarchy does not need to be walked again
+					bpy_editbones = {} # {xsi_frame: bpy_editbone}, for parenting bones to the bone of their parent frame
+					for xsi_frame, bpy_obj in self.bone_frames:
+						bpy_editbones[xsi_frame] = self.create_editbone(xsi_frame, bpy_obj, bpy_editbones.get(xsi_frame.parent))
+				
+				finally: # Never leave blender in edit mode
+					bpy.ops.object.mode_set(mode="OBJECT")
 		
-		if self.opt["import_animations"] and bz2_xsi.is_animated():
+		# walk() has already collected every animated frame, same as bz2_xsi.is_animated() without another walk of the frames
+		if self.opt["import_animations"] and self.animated_objects:
 			root_frame_options = self.opt["rotate_for_yz"] or self.opt["place_at_cursor"]
 			
 			if self.bpy_armature:
@@ -219,16 +337,25 @@ class Load:
 		
 		bpy_obj.matrix_local = matrix
 		
-		self.bpy_objects += [bpy_obj]
-		self.context.view_layer.active_layer_collection.collection.objects.link(bpy_obj)
+		self.bpy_objects.append(bpy_obj) # Linked to the scene by link_objects() once everything is created
 		
 		return bpy_obj
 	
+	# Links the armature and all created objects to the active collection in one tight loop
+	def link_objects(self):
+		link = self.context.view_layer.active_layer_collection.collection.objects.link
+		
+		if self.bpy_armature:
+			link(self.bpy_armature)
+		
+		for bpy_obj in self.bpy_objects:
+			link(bpy_obj)
+	
 	def walk(self, xsi_frame, bpy_parent=None):
 		bpy_matrix = self.import_matrix(xsi_frame.transform)
 		bpy_mesh = None
 		
-		flags = flags_from_name(xsi_frame.name) if self.opt["emulate_flags"] else ""
+		flags = flags_from_name(xsi_frame.name) if self.opt["emulate_flags"] else 0
 		
 		if self.opt["import_mesh"] and xsi_frame.mesh:
 			bpy_mesh = self.import_mesh(xsi_frame.mesh, xsi_frame.name, flags)
@@ -245,8 +372,8 @@ class Load:
 			bpy_obj.empty_display_size = 0.1
 			bpy_obj.show_name = True
 		
-		if "I" not in flags:
-			if "h" in flags or "c" in flags:
+		if not flags & FLAG_IGNORE_HIDDEN:
+			if flags & (FLAG_HARDPOINT | FLAG_COLLISION):
 				# Hardpoints, Collisions and Hidden shown as wireframe in viewport
 				bpy_obj.display_type = "WIRE"
 		
@@ -257,59 +384,54 @@ class Load:
 			# raise Exception("Empty object cannot have envelopes %r." % (bpy_obj.name))
 		
 		if xsi_frame.is_bone:
-			self.bpy_obj_of_bone[xsi_frame.name] = bpy_obj # So walk_skel() can get this object
+			self.bone_frames.append((xsi_frame, bpy_obj)) # Before its sub frames, so parent bones are created first
 		
 		if xsi_frame.animation_keys:
-			self.animated_objects += [(xsi_frame, bpy_obj)]
+			self.animated_objects.append((xsi_frame, bpy_obj))
 		
 		for xsi_sub_frame in xsi_frame.frames:
 			self.walk(xsi_sub_frame, bpy_obj)
 		
 		return bpy_obj
 	
-	def walk_skel(self, xsi_frame, bpy_editbone_parent=None):
-		bpy_editbone = None
+	def create_editbone(self, xsi_frame, bpy_obj, bpy_editbone_parent=None):
+		bpy_editbone = self.bpy_armature.data.edit_bones.new(xsi_frame.name)
+		bpy_editbone.parent = bpy_editbone_parent
 		
-		if xsi_frame.is_bone:
-			bpy_editbone = self.bpy_armature.data.edit_bones.new(xsi_frame.name)
-			bpy_editbone.parent = bpy_editbone_parent
-			
-			bpy_matrix = self.bpy_obj_of_bone[xsi_frame.name].matrix_world
-			bpy_vector = bpy_matrix.to_translation()
-			bpy_editbone.head = (bpy_vector.x, bpy_vector.y, bpy_vector.z)
-			bpy_child_positions = [child.matrix_world.to_translation() for child in self.bpy_obj_of_bone[xsi_frame.name].children]
-			
-			if bpy_child_positions:
-				child_sum = Vector((0.0, 0.0, 0.0))
-				for bpy_child_vector in bpy_child_positions:
-					child_sum += bpy_child_vector
-				
-				child_average = child_sum / len(bpy_child_positions)
-				bpy_editbone.tail = (child_average.x, child_average.y, child_average.z)
+		bpy_matrix = bpy_obj.matrix_world
+		bpy_vector = bpy_matrix.to_translation()
+		bpy_editbone.head = bpy_vector
+		bpy_child_positions = [child.matrix_world.to_translation() for child in bpy_obj.children]
+		
+		if bpy_child_positions:
+			child_sum = Vector((0.0, 0.0, 0.0))
+			for bpy_child_vector in bpy_child_positions:
+				child_sum += bpy_child_vector
 			
-			else:
-				if bpy_editbone_parent:
-					# Make it continue along the same direction as its parent with 1/10 the length
-					bpy_editbone.tail = bpy_editbone_parent.head
-					bpy_editbone.length = -bpy_editbone.length/10
-				
-				else:
-					# No parent, no children.
-					bpy_editbone.tail = (bpy_vector.x, bpy_vector.y, bpy_vector.z + 1.0)
+			bpy_editbone.tail = child_sum / len(bpy_child_positions) # Average
+		
+		else:
+			if bpy_editbone_parent:
+				# Make it continue along the same direction as its parent with 1/10 the length
+				bpy_editbone.tail = bpy_editbone_parent.head
+				bpy_editbone.length = -bpy_editbone.length/10
 			
-			if (bpy_editbone.head == bpy_editbone.tail):
+			else:
+				# No parent, no children.
 				bpy_editbone.tail = (bpy_vector.x, bpy_vector.y, bpy_vector.z + 1.0)
-				print("Zero-length bone %r" % xsi_frame.get_chained_name())
-				# raise Exception("Zero-length bone %r" % xsi_frame.get_chained_name())
-			
-			self.animated_bones.add((xsi_frame, bpy_editbone.name))
 		
-		for xsi_sub_frame in xsi_frame.frames:
-			self.walk_skel(xsi_sub_frame, bpy_editbone)
+		if (bpy_editbone.head == bpy_editbone.tail):
+			bpy_editbone.tail = (bpy_vector.x, bpy_vector.y, bpy_vector.z + 1.0)
+			print("Zero-length bone %r" % xsi_frame.get_chained_name())
+			# raise Exception("Zero-length bone %r" % xsi_frame.get_chained_name())
+		
+		self.animated_bones.add((xsi_frame, bpy_editbone.name))
+		
+		return bpy_editbone
 	
 	def import_light(self, xsi_light):
 		bpy_data = bpy.data.lights.new(name=xsi_light.name, type="POINT")
-		bpy_data.color = tuple(xsi_light.rgb)
+		bpy_data.color = xsi_light.rgb
 		
 		bpy_obj = self.create_object(
 			xsi_light.name,
@@ -347,7 +469,7 @@ class Load:
 		return bpy_obj, bpy_obj_look
 	
 	def import_matrix(self, xsi_matrix):
-		return Matrix(xsi_matrix.to_list()).transposed()
+		return Matrix(xsi_matrix.to_list_transposed())
 	
 	def import_envelopes(self, xsi_frame, bpy_obj):
 		bpy_groups = []
@@ -356,25 +478,58 @@ class Load:
 				bpy_vertgroup = bpy_obj.vertex_groups.new(name=envelope.bone.name)
 				
 				if bpy_vertgroup:
+					# Vertices sharing a weight are added together, one call for each distinct weight
+					vertices_by_weight = {}
 					for vertex_index, weight in envelope.vertices:
-						bpy_vertgroup.add([vertex_index], weight / 100.0, "ADD")
+						vertices_by_weight.setdefault(weight, []).append(vertex_index)
+					
+					for weight, vertex_indices in vertices_by_weight.items():
+						bpy_vertgroup.add(vertex_indices, weight / 100.0, "ADD")
 				
-				bpy_groups += [bpy_vertgroup]
+				bpy_groups.append(bpy_vertgroup)
 		
 		return bpy_groups
 	
+	# Per-loop uv and vertex color data of every mesh is staged in one buffer, only reallocated when a larger one is needed
+	def get_loop_buffer(self, size):
+		if self.loop_buffer.size < size:
+			self.loop_buffer = np.empty(size, dtype=np.float32)
+		
+		return self.loop_buffer
+	
 	def import_mesh(self, xsi_mesh, name, flags):
 		bpy_mesh = bpy.data.meshes.new(name)
-		bpy_mesh.from_pydata(xsi_mesh.vertices, [], xsi_mesh.faces)
+		
+		# Same result as from_pydata(vertices, [], faces), but without building the flattened data as Python tuples
+		bpy_mesh.vertices.add(len(xsi_mesh.vertices))
+		if xsi_mesh.vertices:
+			bpy_mesh.vertices.foreach_set("co", np.asarray(xsi_mesh.vertices, dtype=np.float32).ravel())
+		
+		if xsi_mesh.faces:
+			loop_totals = np.fromiter(map(len, xsi_mesh.faces), dtype=np.int32, count=len(xsi_mesh.faces))
+			loop_starts = np.zeros_like(loop_totals)
+			np.cumsum(loop_totals[:-1], out=loop_starts[1:])
+			
+			bpy_mesh.loops.add(int(loop_totals.sum()))
+			bpy_mesh.polygons.add(len(loop_totals))
+			
+			bpy_mesh.polygons.foreach_set("loop_start", loop_starts)
+			if bpy.app.version < (4, 0, 0):
+				bpy_mesh.polygons.foreach_set("loop_total", loop_totals) # Read-only since 4.0, derived from loop_start
+			bpy_mesh.polygons.foreach_set("vertices", np.fromiter(chain.from_iterable(xsi_mesh.faces), dtype=np.int32))
+			
+			if hasattr(bpy_mesh, "shade_flat"):
+				bpy_mesh.shade_flat() # Faces are smooth by default since 4.1
+			
+			bpy_mesh.update(calc_edges=True)
 		
 		if self.opt["import_mesh_normals"] and xsi_mesh.normal_vertices:
 			if xsi_mesh.normal_faces:
 				try:
-					normals = []
-					for norm_face in xsi_mesh.normal_faces:
-						for norm_index in norm_face:
-							normals += [xsi_mesh.normal_vertices[norm_index]]
-					bpy_mesh.normals_split_custom_set(normals)
+					# Gathered per loop in one float32 index operation, converted to the sequence the API expects in one call
+					norm_indices = np.fromiter(chain.from_iterable(xsi_mesh.normal_faces), dtype=np.intp)
+					normals = np.asarray(xsi_mesh.normal_vertices, dtype=np.float32).reshape(-1, 3)[norm_indices]
+					bpy_mesh.normals_split_custom_set(normals.tolist())
 				
 				except IndexError:
 					bpy_mesh.normals_split_custom_set_from_vertices(xsi_mesh.normal_vertices)
@@ -393,102 +548,132 @@ class Load:
 						self.import_material(
 							xsi_material,
 							"%s %d" % (name, index),
-							emissive=bool("e" in flags or "g" in flags),
-							emissive_strength=7.0 if "g" in flags else 1.0,
-							double_sided=bool("2" in flags),
+							emissive=bool(flags & (FLAG_EMISSIVE | FLAG_GLOW)),
+							emissive_strength=7.0 if flags & FLAG_GLOW else 1.0,
+							double_sided=bool(flags & FLAG_DOUBLE_SIDED),
 							use_vcol=bool(xsi_mesh.vertex_colors),
-							notex=bool("F" in flags) # ignore texture if true
+							notex=bool(flags & FLAG_FLAME) # ignore texture if true
 						)
 					)
 				
 				for index, material_index in enumerate(xsi_face_indices):
 					bpy_mesh.polygons[index].material_index = material_index
 		
+		# UVs and vertex colors are per loop, set in bulk rather than loop by loop
 		if self.opt["import_mesh_uvmap"] and xsi_mesh.uv_vertices:
 			bpy_uvmap = bpy_mesh.uv_layers.new().data
-			
-			if xsi_mesh.uv_faces:
-				bpy_uv_index = 0
-				for uv_face in xsi_mesh.uv_faces:
-					for uv_index in uv_face:
-						bpy_uvmap[bpy_uv_index].uv = Vector(tuple(xsi_mesh.uv_vertices[uv_index]))
-						bpy_uv_index += 1
-			
-			else:
-				for index, uv_vert in enumerate(xsi_mesh.uv_vertices):
-					bpy_uvmap[index].uv = Vector(tuple(uv_vert))
+			bpy_uvmap.foreach_set("uv", loop_data_to_array(
+				xsi_mesh.uv_vertices, xsi_mesh.uv_faces, len(bpy_uvmap), 2,
+				out=self.get_loop_buffer(len(bpy_uvmap) * 2)
+			))
 		
 		if self.opt["import_mesh_vertcolor"] and xsi_mesh.vertex_colors:
 			bpy_vcol = bpy_mesh.vertex_colors.new().data
-			
-			if xsi_mesh.vertex_color_faces:
-				bpy_vcol_index = 0
-				for vcol_face in xsi_mesh.vertex_color_faces:
-					for vcol_index in vcol_face:
-						bpy_vcol[bpy_vcol_index].color = tuple(xsi_mesh.vertex_colors[vcol_index])
-						bpy_vcol_index += 1
-			else:
-				for index, color in enumerate(xsi_mesh.vertex_colors):
-					bpy_vcol[index].color = tuple(color)
+			bpy_vcol.foreach_set("color", loop_data_to_array(
+				xsi_mesh.vertex_colors, xsi_mesh.vertex_color_faces, len(bpy_vcol), 4, fill=1.0,
+				out=self.get_loop_buffer(len(bpy_vcol) * 4)
+			))
 		
 		return bpy_mesh
 	
 	def import_material(self, xsi_material, name, emissive=False, emissive_strength=1.0, double_sided=False, use_vcol=False, notex=False):
-		COL = 320 # column spacing for nodes
-		
 		image_filepath = xsi_material.texture
-		bpy_material = bpy.data.materials.new(name=name)
-		bpy_material.use_nodes = True
-		bpy_material.use_backface_culling = not double_sided
-		bpy_material.show_transparent_back = double_sided
-		bpy_material.blend_method = "BLEND"
+		use_texture = type(image_filepath) == str and not notex
+		is_chrome = use_texture and os.path.basename(image_filepath)[0:-4].casefold() == "reflection3" # BZ2 Chrome
+		
+		# Materials with the same node setup are copied from the first one built, only their values differ
+		template_key = (use_vcol, use_texture, emissive, double_sided, is_chrome)
+		bpy_material_template = self.material_templates.get(template_key)
+		
+		if bpy_material_template is None:
+			bpy_material = self.material_templates[template_key] = self.build_material(name, *template_key)
+		else:
+			bpy_material = bpy_material_template.copy()
+			bpy_material.name = name
+		
+		bpy_nodes = bpy_material.node_tree.nodes
 		
 		alpha = float(xsi_material.diffuse[3]) if len(xsi_material.diffuse) >= 4 else 1.0
 		specular_rgb = tuple(float(x) for x in xsi_material.specular[0:3]) if len(xsi_material.specular) >= 3 else (0.5, 0.5, 0.5)
 		
-		bpy_node_bsdf = bpy_material.node_tree.nodes["Principled BSDF"]
+		bpy_node_bsdf = bpy_nodes["Principled BSDF"]
 		bpy_node_bsdf.inputs["Base Color"].default_value = tuple(xsi_material.diffuse[0:3]) + (1.0,)
-		bpy_node_bsdf.inputs["Specular IOR Level"].default_value = 0.5 # Specular Intensity
 		bpy_node_bsdf.inputs["Specular Tint"].default_value = tuple((*specular_rgb, 1.0))
 		bpy_node_bsdf.inputs["Alpha"].default_value = alpha
 		bpy_node_bsdf.inputs["Emission Strength"].default_value = emissive_strength
 		bpy_node_bsdf.inputs["Emission Color"].default_value = xsi_material.diffuse if emissive else (0.0, 0.0, 0.0, 0.0) # Emissive
 		
+		if use_texture:
+			image = image_utils.load_image(
+				find_texture(image_filepath, (self.filefolder, self.tex_dir), self.ext_list, self.opt["find_textures"], self.texture_index),
+				place_holder=True,
+				check_existing=True
+			)
+			
+			bpy_node_texture = bpy_nodes["Texture"]
+			bpy_node_texture.label = os.path.basename(image_filepath)
+			bpy_node_texture.image = image
+			
+			bpy_nodes["Color Mix"].inputs["Color1"].default_value = bpy_node_bsdf.inputs[0].default_value # Default Mix
+			bpy_nodes["Alpha Math"].inputs[0].default_value = bpy_node_bsdf.inputs["Alpha"].default_value
+		
+		if self.opt["add_material_overrides"]: # Blender Material Custom Properties
+			bpy_material["diffuse"] = [float(value) for value in xsi_material.diffuse]
+			bpy_material["hardness"] = float(xsi_material.hardness)
+			bpy_material["specular"] = [float(value) for value in xsi_material.specular]
+			bpy_material["ambient"] = [float(value) for value in xsi_material.ambient]
+			bpy_material["emissive"] = [float(value) for value in xsi_material.emissive]
+			bpy_material["shading_type"] = int(xsi_material.shading_type)
+			
+			if xsi_material.texture:
+				bpy_material["texture"] = str(xsi_material.texture)
+			
+			elif "texture" in bpy_material: # Copied from the template
+				del bpy_material["texture"]
+		
+		return bpy_material
+	
+	# Builds the node setup of a material, values depending on the XSI material are set by import_material()
+	def build_material(self, name, use_vcol, use_texture, emissive, double_sided, is_chrome):
+		COL = 320 # column spacing for nodes
+		
+		bpy_material = bpy.data.materials.new(name=name)
+		bpy_material.use_nodes = True
+		bpy_material.use_backface_culling = not double_sided
+		bpy_material.show_transparent_back = double_sided
+		bpy_material.blend_method = "BLEND"
+		
+		bpy_node_bsdf = bpy_material.node_tree.nodes["Principled BSDF"]
+		bpy_node_bsdf.inputs["Specular IOR Level"].default_value = 0.5 # Specular Intensity
+		
 		if use_vcol:
 			bpy_node_attribute = bpy_material.node_tree.nodes.new("ShaderNodeAttribute")
+			bpy_node_attribute.name = "Vertex Color"
 			bpy_node_attribute.attribute_name = "Col"
 			bpy_node_attribute.attribute_type = "GEOMETRY"
 			bpy_node_attribute.location = (-COL*2, COL)
 		
 		# Texture is used for material
-		if type(image_filepath) == str and not notex:
-			image = image_utils.load_image(
-				find_texture(image_filepath, (self.filefolder, self.tex_dir), self.ext_list, self.opt["find_textures"]),
-				place_holder=True,
-				check_existing=True
-			)
-			
-			# BZ2 Chrome
-			if os.path.basename(image_filepath)[0:-4].casefold() == "reflection3":
+		if use_texture:
+			if is_chrome:
 				bpy_node_bsdf.inputs[4].default_value = 1.0 # Metallic
 				bpy_node_bsdf.inputs[7].default_value = 0.0 # Roughness
 			
 			# Texture image
 			bpy_node_texture = bpy_material.node_tree.nodes.new("ShaderNodeTexImage")
-			bpy_node_texture.label = os.path.basename(image_filepath)
-			bpy_node_texture.image = image
+			bpy_node_texture.name = "Texture"
 			bpy_node_texture.location = (-COL*2, 0)
 			
 			# Multiplies with either diffuse color, or with vertex color (which overrides diffuse)
 			bpy_node_mixrgb = bpy_material.node_tree.nodes.new("ShaderNodeMixRGB")
+			bpy_node_mixrgb.name = "Color Mix"
 			bpy_node_mixrgb.inputs["Fac"].default_value = 1.0 # Factor
-			bpy_node_mixrgb.inputs["Color1"].default_value = bpy_node_bsdf.inputs[0].default_value # Default Mix
 			bpy_node_mixrgb.blend_type = "MULTIPLY"
 			bpy_node_mixrgb.location = (-COL, 0)
 			
 			# Alpha mixed (lowest value used) with vertex color alpha or diffuse alpha
 			bpy_node_alphamath = bpy_material.node_tree.nodes.new("ShaderNodeMath")
-			bpy_node_alphamath.inputs[0].default_value = bpy_node_bsdf.inputs["Alpha"].default_value
+			bpy_node_alphamath.name = "Alpha Math"
 			bpy_node_alphamath.operation = "MINIMUM" # Use whichever is more transparent - texture alpha vs vertex or diffuse alpha
 			bpy_node_alphamath.location = (-COL, -COL)
 			
@@ -563,17 +748,6 @@ class Load:
 						bpy_node_bsdf.inputs["Emission Color"]
 					)
 		
-		if self.opt["add_material_overrides"]: # Blender Material Custom Properties
-			bpy_material["diffuse"] = [float(value) for value in xsi_material.diffuse]
-			bpy_material["hardness"] = float(xsi_material.hardness)
-			bpy_material["specular"] = [float(value) for value in xsi_material.specular]
-			bpy_material["ambient"] = [float(value) for value in xsi_material.ambient]
-			bpy_material["emissive"] = [float(value) for value in xsi_material.emissive]
-			bpy_material["shading_type"] = int(xsi_material.shading_type)
-			
-			if xsi_material.texture:
-				bpy_material["texture"] = str(xsi_material.texture)
-		
 		return bpy_material
 	
 	def import_animations(self, xsi_frame, bpy_animated, bpy_anim, as_bone=False):
@@ -590,6 +764,9 @@ class Load:
 			# bpy_animated is an Object
 			bpy_mult = bpy_animated.matrix_local
 		
+		# Rotation of a key matrix transposed and multiplied by bpy_mult, as a quaternion product with this
+		bpy_mult_quat = bpy_mult.to_quaternion()
+		
 		for xsi_animkey in xsi_frame.animation_keys:
 			key_type = xsi_animkey.key_type
 			
@@ -608,25 +785,43 @@ class Load:
 			
 			vector_size = xsi_animkey.TYPE_SIZE[key_type]
 			data_path = key_data_paths[key_type]
-			keys = xsi_animkey.keys.copy()
+			# Keyframes and their vectors are split once into a list and an (N, vector_size) array, transformed as a whole
+			frames = [keyframe for keyframe, vector in xsi_animkey.keys]
+			vectors = np.asarray([vector for keyframe, vector in xsi_animkey.keys], dtype=np.float64).reshape(-1, vector_size)
 			
 			if key_type == 0:
 				if not self.opt["quat_anims_to_euler"]:
 					# WXYZ Quaternion
-					for index, (keyframe, vector) in enumerate(keys):
-						bpy_matrix = Quaternion(vector).to_matrix().to_4x4().transposed() @ bpy_mult
-						bpy_quat = bpy_matrix.to_quaternion()
-						keys[index] = keyframe, (bpy_quat.w, bpy_quat.x, bpy_quat.y, bpy_quat.z)
+					# The rotation of Quaternion(q).to_matrix().transposed() @ bpy_mult is conjugate(q) * bpy_mult's rotation,
+					# computed for all keys at once. W is kept non-negative like Matrix.to_quaternion() does.
+					# Quaternion.to_matrix() doesn't normalize, so zero and non-unit keys go through the matrix instead.
+					if frames:
+						norms = np.linalg.norm(vectors, axis=1)
+						irregular = np.flatnonzero(np.abs(norms - 1.0) > 1e-6)
+						irregular_quats = [
+							tuple((Quaternion(vector).to_matrix().to_4x4().transposed() @ bpy_mult).to_quaternion())
+							for vector in vectors[irregular].tolist()
+						]
+						
+						norms[irregular] = 1.0
+						vectors /= norms[:, np.newaxis]
+						vectors[:, 1:] *= -1.0
+						vectors = quaternion_multiply(vectors, np.asarray(bpy_mult_quat, dtype=np.float64))
+						vectors[vectors[:, 0] < 0.0] *= -1.0
+						
+						if irregular_quats:
+							vectors[irregular] = irregular_quats
 					
 					bpy_animated.rotation_mode = "QUATERNION"
 				
 				else:
-					# WXYZ Quaternion converted to XYZ Euler
-					for index, (keyframe, vector) in enumerate(keys):
-						bpy_quat = Quaternion((vector[0], vector[1], vector[2], vector[3]))
-						bpy_matrix = bpy_quat.to_matrix().to_4x4().transposed() @ bpy_mult
-						bpy_euler = bpy_matrix.to_euler()
-						keys[index] = keyframe, (bpy_euler.x, bpy_euler.y, bpy_euler.z)
+					# WXYZ Quaternion converted to XYZ Euler, zero and non-unit keys go through the matrix like above
+					regular = np.abs(np.linalg.norm(vectors, axis=1) - 1.0) <= 1e-6
+					vectors = np.array([
+						tuple((Quaternion(vector).normalized().conjugated() @ bpy_mult_quat).to_euler()) if is_regular else
+						tuple((Quaternion(vector).to_matrix().to_4x4().transposed() @ bpy_mult).to_euler())
+						for vector, is_regular in zip(vectors.tolist(), regular.tolist())
+					], dtype=np.float64).reshape(-1, 3)
 					
 					data_path = key_data_paths[3]
 					vector_size = xsi_animkey.TYPE_SIZE[3]
@@ -636,10 +831,9 @@ class Load:
 			
 			elif key_type == 3:
 				# XYZ Euler
-				for index, (keyframe, vector) in enumerate(keys):
-					bpy_matrix = Euler(vector).to_matrix().to_4x4().transposed() @ bpy_mult
-					bpy_euler = bpy_matrix.to_euler()
-					keys[index] = keyframe, (bpy_euler.x, bpy_euler.y, bpy_euler.z)
+				vectors = np.array([
+					tuple((Euler(vector).to_quaternion().conjugated() @ bpy_mult_quat).to_euler()) for vector in vectors.tolist()
+				], dtype=np.float64).reshape(-1, 3)
 			
 			elif key_type == 2:
 				# XYZ Translation
@@ -653,27 +847,25 @@ class Load:
 				is_quaternion = (key_type == 0)
 				
 				if is_quaternion: # Convert from quaternion to euler
-					for index, (keyframe, vector) in enumerate(keys):
-						bpy_euler = Quaternion((vector[0], vector[1], vector[2], vector[3])).to_euler()
-						keys[index] = keyframe, (bpy_euler.x, bpy_euler.y, bpy_euler.z)
+					vectors = np.array([tuple(Quaternion(vector).to_euler()) for vector in vectors.tolist()], dtype=np.float64).reshape(-1, 3)
 				
 				max_rotation = radians(360)
-				for index, (keyframe, vector) in enumerate(keys):
-					keys[index] = keyframe, [v % max_rotation for v in vector]
+				np.mod(vectors, max_rotation, out=vectors) # Same as Python's % for a positive divisor
 				
 				if is_quaternion: # Convert back to quaternion from euler, after having removed negative rotations
-					for index, (keyframe, vector) in enumerate(keys):
-						bpy_quat = Euler((vector[0], vector[1], vector[2])).to_quaternion()
-						keys[index] = keyframe, (bpy_quat.w, bpy_quat.x, bpy_quat.y, bpy_quat.z)
+					vectors = np.array([tuple(Euler(vector).to_quaternion()) for vector in vectors.tolist()], dtype=np.float64).reshape(-1, 4)
 			
 			fcurves = [bpy_anim.action.fcurves.new(data_path=data_path, index=index) for index in range(vector_size)]
 			
-			for fcurve in fcurves:
-				fcurve.keyframe_points.add(len(keys))
-			
-			for index, (keyframe, vector) in enumerate(keys):
+			# Each fcurve gets all of its (keyframe, value) points in one foreach_set, sharing the keyframe column
+			if frames:
+				co = np.empty((len(frames), 2), dtype=np.float32)
+				co[:, 0] = frames
+				
 				for fcurve_index, fcurve in enumerate(fcurves):
-					fcurve.keyframe_points[index].co = keyframe, vector[fcurve_index]
+					co[:, 1] = vectors[:, fcurve_index]
+					fcurve.keyframe_points.add(len(frames))
+					fcurve.keyframe_points.foreach_set("co", co.ravel())
 			
 			for fcurve in fcurves:
 				fcurve.extrapolation = "LINEAR"